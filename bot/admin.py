@@ -1,8 +1,14 @@
 from django.contrib import admin
 
-from .models import TelegramUser
+from .models import ScrapedListing, TelegramUser
 
 
 @admin.register(TelegramUser)
 class TelegramUserAdmin(admin.ModelAdmin):
     list_display = ("telegram_id", "first_interaction")
+
+
+@admin.register(ScrapedListing)
+class ScrapedListingAdmin(admin.ModelAdmin):
+    list_display = ("listing_id", "title", "price", "seller", "scraped_at")
+    search_fields = ("listing_id", "title", "query")
@@ -0,0 +1,135 @@
+import asyncio
+import importlib
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Тяжёлые модули (Playwright, aiohttp, reportlab, Pillow), которые не нужны
+# для начала polling. Загружаются в фоне после запуска бота
+PREWARM_MODULES = ["bot.parser", "bot.pdf", "bot.thumbnails"]
+
+
+# ---------------------------------------------------------------------
+# Замер времени запуска
+# ---------------------------------------------------------------------
+class StartupProfile:
+    def __init__(self):
+        self.steps = []
+
+    @contextmanager
+    def step(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - started))
+
+    def report(self):
+        lines = [f"{name:<32} {seconds * 1000:8.1f} мс" for name, seconds in self.steps]
+        total = sum(seconds for _, seconds in self.steps)
+        lines.append(f"{'итого':<32} {total * 1000:8.1f} мс")
+        return "\n".join(lines)
+
+
+profile = StartupProfile()
+_prewarm_task = None
+
+
+def build_application(webhook=False):
+    """
+    Собирает приложение бота с обработчиками. Модули парсинга и генерации
+    PDF здесь не импортируются.
+
+    :param webhook: Обновления приходят через webhook (bot.webhook),
+        а не через polling, поэтому Updater не создаётся.
+    """
+    with profile.step("import telegram.ext"):
+        from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
+
+    with profile.step("import bot.handlers"):
+        from bot.handlers import cancel_command, handle_message, start_command, status_command
+
+    with profile.step("сборка Application"):
+        # Обновления обрабатываются параллельно, но не больше
+        # BOT_CONCURRENT_UPDATES одновременно
+        builder = (
+            ApplicationBuilder()
+            .token(settings.API_KEY)
+            .concurrent_updates(settings.BOT_CONCURRENT_UPDATES)
+            .post_init(on_startup)
+            .post_shutdown(on_shutdown)
+        )
+        if webhook:
+            builder = builder.updater(None)
+        application = builder.build()
+
+        application.add_handler(
+            MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message)
+        )
+        application.add_handler(CommandHandler("start", start_command))
+        application.add_handler(CommandHandler("status", status_command))
+        application.add_handler(CommandHandler("cancel", cancel_command))
+    return application
+
+
+async def prewarm():
+    """
+    Загружает тяжёлые модули, регистрирует шрифты и запускает пул браузеров,
+    чтобы первый поиск не ждал инициализации.
+    """
+    for name in PREWARM_MODULES:
+        with profile.step(f"import {name}"):
+            await asyncio.to_thread(importlib.import_module, name)
+
+    from bot import pdf
+
+    with profile.step("регистрация шрифтов"):
+        await asyncio.to_thread(pdf.register_fonts)
+
+    # При работе через Celery браузеры запускают воркеры
+    if settings.SEARCH_BACKEND == "local":
+        from bot.browser_pool import browser_pool
+
+        with profile.step("запуск пула браузеров"):
+            await browser_pool.start()
+
+
+# ---------------------------------------------------------------------
+# Запуск и остановка общих ресурсов вместе с ботом
+# ---------------------------------------------------------------------
+async def on_startup(application):
+    global _prewarm_task
+
+    async def run():
+        try:
+            await prewarm()
+            logger.info(f"Прогрев завершён:\n{profile.report()}")
+        except Exception as e:
+            logger.exception(f"Ошибка прогрева: {e}")
+
+    # Не задерживает начало polling
+    _prewarm_task = asyncio.create_task(run())
+
+
+async def on_shutdown(application):
+    if _prewarm_task is not None and not _prewarm_task.done():
+        _prewarm_task.cancel()
+
+    # Останавливается только то, что успело загрузиться. Дочерние процессы
+    # пулов наследуют каналы драйвера Playwright: пока они живы,
+    # остановка Playwright зависает
+    for name in ("bot.thumbnails", "bot.pdf"):
+        module = sys.modules.get(name)
+        if module is not None:
+            module.shutdown_executor()
+    if "bot.browser_pool" in sys.modules:
+        await sys.modules["bot.browser_pool"].browser_pool.close()
+    if "bot.downloader" in sys.modules:
+        await sys.modules["bot.downloader"].image_downloader.close()
+    if "bot.http_parser" in sys.modules:
+        await sys.modules["bot.http_parser"].close_session()
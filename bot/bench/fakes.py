@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+
+# ---------------------------------------------------------------------
+# Заглушки объектов Telegram для прогона обработчиков без сети
+# ---------------------------------------------------------------------
+
+
+class FakeMessage:
+    """
+    Сообщение пользователя. Ответы бота не отправляются, а складываются
+    в replies и documents.
+    """
+
+    def __init__(self, text, message_id=1, chat_id=1):
+        self.text = text
+        self.message_id = message_id
+        self.chat = SimpleNamespace(id=chat_id)
+        self.replies = []
+        self.documents = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+    async def reply_document(self, document, filename=None, **kwargs):
+        self.documents.append((filename, document))
+
+
+class FakeUpdate:
+    """
+    Минимальная замена telegram.Update для handle_message и process_and_send_pdf.
+    """
+
+    def __init__(self, text, user_id=1, message_id=1):
+        self.message = FakeMessage(text, message_id=message_id, chat_id=user_id)
+        self.effective_user = SimpleNamespace(id=user_id)
+        self.effective_chat = self.message.chat
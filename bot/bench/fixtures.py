@@ -0,0 +1,181 @@
+import asyncio
+from html import escape
+from io import BytesIO
+
+from aiohttp import web
+from PIL import Image
+
+from bot.listing import Listing
+
+# Сколько разных картинок отдаёт сервер; ссылки на них повторяются по кругу
+IMAGE_VARIANTS = 16
+
+TITLES = [
+    "Смартфон Apple iPhone 13, 128 ГБ",
+    "Samsung Galaxy S22 Ultra 12/256 ГБ",
+    "Xiaomi Redmi Note 12 Pro 8/256",
+    "Google Pixel 7, как новый",
+    "Apple iPhone 12 mini <64 ГБ> & чехол",
+]
+SELLERS = [
+    ("ИП Иванов", "4,8", "127 отзывов"),
+    ("Магазин «Техно»", "5,0", "1 204 отзыва"),
+    ("Анна", None, "Нет отзывов"),
+    ("Сергей", "4,2", "3 отзыва"),
+]
+TEXT = (
+    "Продаю в отличном состоянии, полный комплект, все документы и чек. "
+    "Торг уместен, возможна доставка. Звоните в любое время. "
+)
+
+
+def sample_image(width=472, height=354, seed=0):
+    """
+    JPEG размером с фото из выдачи Avito.
+    """
+    color = (40 + seed * 13 % 200, 120 + seed * 7 % 120, 200 - seed * 11 % 160)
+    image = Image.new("RGB", (width, height), color)
+    # Полосы, чтобы картинка не сжималась до пары сотен байт
+    for x in range(0, width, 8):
+        for y in range(height):
+            image.putpixel((x, y), (x % 255, y % 255, seed * 29 % 255))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def sample_listings(count):
+    """
+    Синтетические объявления с текстами типичной для Avito длины.
+    """
+    buffer = BytesIO()
+    Image.new("RGB", (213, 160), (200, 120, 40)).save(buffer, format="JPEG")
+    image = buffer.getvalue()
+
+    pics = [image] * min(count, 50)
+    listings = [
+        Listing(
+            id=str(i),
+            url=f"https://www.avito.ru/moskva/telefony/iphone_13_{i}",
+            title=f"Смартфон Apple iPhone 13, 128 ГБ, объявление {i}",
+            price=54990,
+            seller="ИП Иванов",
+            rating=4.8,
+            reviews=127,
+            text=TEXT * 2,
+            image_url=None,
+        )
+        for i in range(count)
+    ]
+    return pics, listings
+
+
+# ---------------------------------------------------------------------
+# Страница выдачи с той же разметкой карточек, что у Avito
+# ---------------------------------------------------------------------
+
+
+def render_card(number):
+    title = TITLES[number % len(TITLES)]
+    seller, rating, reviews = SELLERS[number % len(SELLERS)]
+    if number % 17 == 0:
+        price = "Цена не указана"
+    else:
+        price = f"{30000 + number * 10:,} ₽".replace(",", "\xa0")
+    image = f"/images/{number % IMAGE_VARIANTS}.jpg?item={number}"
+    stats = "".join(f"<div>{escape(value)}</div>" for value in (rating, reviews) if value)
+    return f"""
+<div class="iva-item-root-Se7z4" data-marker="item" data-item-id="{number}">
+  <div class="iva-item-content-OWwoq">
+    <div class="iva-item-slider-BOsti">
+      <img src="{image}" width="236" height="177" alt="">
+    </div>
+    <div class="iva-item-body-GQomw">
+      <a href="/moskva/telefony/{escape(title.split(',')[0].lower().replace(' ', '_'))}_{number}"
+         itemprop="url">{escape(title)}</a>
+      <p><span>{price}</span></p>
+      <div class="style-root-Dh2i5"><p>{escape(seller)}</p>{stats}</div>
+      <div class="iva-item-bottomBlock-FhNhY"><p>{escape(TEXT)}</p></div>
+    </div>
+  </div>
+</div>"""
+
+
+def render_search_page(page, per_page):
+    """
+    HTML страницы выдачи номер page с per_page карточками. Номера
+    объявлений на разных страницах не пересекаются.
+    """
+    first = (page - 1) * per_page
+    cards = "".join(render_card(number) for number in range(first, first + per_page))
+    return f"""<!DOCTYPE html>
+<html lang="ru">
+<head><meta charset="utf-8"><title>Объявления: страница {page}</title>
+<style>.iva-item-root-Se7z4 {{ height: 260px; border-bottom: 1px solid #eee; }}</style>
+</head>
+<body><div data-marker="catalog-serp">{cards}</div></body>
+</html>"""
+
+
+# ---------------------------------------------------------------------
+# Локальный HTTP-сервер с выдачей и картинками
+# ---------------------------------------------------------------------
+
+
+class FixtureServer:
+    """
+    Отдаёт страницы выдачи (параметр p - номер страницы) и картинки
+    с 127.0.0.1, чтобы замеры не зависели от сети и от самого Avito.
+
+    :param per_page: Карточек на странице выдачи.
+    :param latency: Искусственная задержка ответа на картинку в секундах.
+    """
+
+    def __init__(self, per_page=50, latency=0.0):
+        self.per_page = per_page
+        self.latency = latency
+        self.requests = {"pages": 0, "images": 0}
+        self._images = [sample_image(seed=i) for i in range(IMAGE_VARIANTS)]
+        self._pages = {}
+        self._runner = None
+        self.base_url = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/images/{name}.jpg", self._image)
+        app.router.add_get("/{tail:.*}", self._search_page)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+        return self
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def url(self, path):
+        return self.base_url + path
+
+    async def _search_page(self, request):
+        self.requests["pages"] += 1
+        page = int(request.query.get("p", 1))
+        if page not in self._pages:
+            self._pages[page] = render_search_page(page, self.per_page)
+        return web.Response(text=self._pages[page], content_type="text/html")
+
+    async def _image(self, request):
+        self.requests["images"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        data = self._images[int(request.match_info["name"]) % IMAGE_VARIANTS]
+        return web.Response(body=data, content_type="image/jpeg")
@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+
+from bot import http_parser, pdf, thumbnails
+from bot.bench.fakes import FakeMessage, FakeUpdate
+from bot.bench.fixtures import FixtureServer
+from bot.bench.suite import git_revision
+from bot.browser_pool import browser_pool
+from bot.downloader import image_downloader
+from bot.handlers import ERROR_REPLY, SUPERSEDED_REPLY, TIMEOUT_REPLY, handle_message
+from bot.metrics import peak_rss
+from bot.scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Ответ бота, когда у пользователя переполнена очередь
+REJECTED_REPLY = "слишком много запросов"
+
+RECORDED_SETTINGS = [
+    "PARSER_BACKEND",
+    "BROWSER_POOL_SIZE",
+    "CRAWL_TABS",
+    "SCRAPE_MAX_CONCURRENT",
+    "SCRAPE_USER_QUEUE_DEPTH",
+    "SEARCH_SUPERSEDE",
+    "SEARCH_JOB_TIMEOUT",
+    "IMAGE_DOWNLOAD_CONCURRENCY",
+    "THUMBNAIL_WORKERS",
+    "PDF_WORKERS",
+    "SEARCH_LIMIT",
+]
+
+
+# ---------------------------------------------------------------------
+# Сообщение, которое знает, чем закончилась его обработка
+# ---------------------------------------------------------------------
+
+
+class LoadMessage(FakeMessage):
+    """
+    Сообщение пользователя, которое отмечает время отправки PDF
+    или ответа с ошибкой. Сообщение, которое заменил более новый запрос
+    того же пользователя, отмечается как отменённое.
+    """
+
+    def __init__(self, text, message_id, chat_id):
+        super().__init__(text, message_id=message_id, chat_id=chat_id)
+        self.sent_at = time.perf_counter()
+        self.first_reply_at = None
+        self.outcome = asyncio.get_running_loop().create_future()
+
+    def _finish(self, status):
+        if not self.outcome.done():
+            self.outcome.set_result((status, time.perf_counter() - self.sent_at))
+
+    async def reply_text(self, text, **kwargs):
+        await super().reply_text(text, **kwargs)
+        if self.first_reply_at is None:
+            self.first_reply_at = time.perf_counter()
+        if text == ERROR_REPLY:
+            self._finish("error")
+        elif text == TIMEOUT_REPLY:
+            self._finish("timeout")
+        elif REJECTED_REPLY in text:
+            self._finish("rejected")
+
+    async def reply_document(self, document, filename=None, **kwargs):
+        await super().reply_document(document, filename=filename, **kwargs)
+        self._finish("success")
+
+
+class LoadUpdate(FakeUpdate):
+    def __init__(self, text, user_id, message_id):
+        super().__init__(text, user_id=user_id, message_id=message_id)
+        self.message = LoadMessage(text, message_id=message_id, chat_id=user_id)
+        self.effective_chat = self.message.chat
+
+
+# ---------------------------------------------------------------------
+# Память и браузеры во время прогона
+# ---------------------------------------------------------------------
+
+
+def _process_tree():
+    """
+    :return: PID текущего процесса и всех его потомков (браузеры, пулы).
+        Только Linux, на других системах - только текущий процесс.
+    """
+    pids = {os.getpid()}
+    try:
+        parents = {}
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry.name}/stat") as f:
+                    # Имя процесса в скобках может содержать пробелы
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            parents.setdefault(ppid, []).append(int(entry.name))
+    except OSError:
+        return pids
+    stack = [os.getpid()]
+    while stack:
+        for child in parents.get(stack.pop(), ()):
+            if child not in pids:
+                pids.add(child)
+                stack.append(child)
+    return pids
+
+
+def tree_rss():
+    """
+    :return: Суммарный RSS процесса и его потомков в байтах или None,
+        если /proc недоступен.
+    """
+    total = 0
+    for pid in _process_tree():
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            continue
+    return total or None
+
+
+class Sampler:
+    """
+    Раз в interval секунд запоминает максимум RSS дерева процессов,
+    запущенных браузеров и открытых контекстов.
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.peak = Counter()
+        self._task = None
+
+    def sample(self):
+        values = {"rss_bytes": tree_rss() or 0, **browser_pool.stats()}
+        values["running_jobs"] = scheduler.running
+        values["queued_jobs"] = scheduler.queued
+        for name, value in values.items():
+            self.peak[name] = max(self.peak[name], value)
+
+    async def _run(self):
+        while True:
+            await asyncio.to_thread(self.sample)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self.sample()
+
+
+# ---------------------------------------------------------------------
+# Прогон
+# ---------------------------------------------------------------------
+
+
+def percentile(values, p):
+    """
+    Перцентиль p (0-100) по методу ближайшего ранга.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+async def run_load(
+    users=10,
+    messages=None,
+    rate=1.0,
+    distinct=None,
+    timeout=300.0,
+    latency=0.0,
+    backend="browser",
+):
+    """
+    Отправляет handle_message сообщения от users пользователей с частотой
+    rate сообщений в секунду и ждёт PDF по каждому. Выдача и картинки
+    отдаются локальным FixtureServer, Telegram заменён заглушками.
+
+    :param users: Количество пользователей; сообщения раздаются им по кругу.
+        При SEARCH_SUPERSEDE новое сообщение отменяет предыдущее сообщение
+        пользователя, если по нему ещё нет PDF.
+    :param messages: Всего сообщений, по умолчанию по два на пользователя.
+    :param rate: Сообщений в секунду.
+    :param distinct: Сколько разных ссылок среди сообщений (остальные
+        повторяются и попадают в кэш результатов), по умолчанию все разные.
+    :param timeout: Сколько секунд ждать PDF по одному сообщению.
+    :param latency: Задержка ответа сервера на картинку в секундах.
+    :param backend: Как получать выдачу: "browser", "http" или "auto"
+        (см. PARSER_BACKEND). На время прогона заменяет настройку.
+    :return: Словарь с настройками и результатами, готовый для JSON.
+    """
+    messages = messages or users * 2
+    distinct = distinct or messages
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "settings": {name: getattr(settings, name) for name in RECORDED_SETTINGS},
+        "users": users,
+        "messages": messages,
+        "rate": rate,
+        "distinct": distinct,
+        "backend": backend,
+    }
+
+    sampler = Sampler()
+    updates = []
+    last_update = {}
+    parser_backend, settings.PARSER_BACKEND = settings.PARSER_BACKEND, backend
+    try:
+        async with FixtureServer(per_page=settings.AVITO_PAGE_SIZE, latency=latency) as server:
+            sampler.start()
+            started = time.perf_counter()
+            for i in range(messages):
+                # Отправка по расписанию: отставание не копится
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                url = server.url(f"/moskva/telefony?q=load&run={i % distinct}")
+                user_id = 1 + i % users
+                update = LoadUpdate(url, user_id=user_id, message_id=i + 1)
+                updates.append(update)
+                await handle_message(update, None)
+                if SUPERSEDED_REPLY in update.message.replies:
+                    last_update[user_id].message._finish("cancelled")
+                last_update[user_id] = update
+
+            outcomes = await asyncio.gather(
+                *(_wait_outcome(update.message, timeout) for update in updates)
+            )
+            elapsed = time.perf_counter() - started
+            try:
+                await asyncio.wait_for(scheduler.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Не все задачи завершились к концу прогона")
+            await sampler.stop()
+            report["requests"] = dict(server.requests)
+    finally:
+        settings.PARSER_BACKEND = parser_backend
+        # Дочерние процессы пулов наследуют каналы драйвера Playwright,
+        # поэтому пулы останавливаются раньше браузеров
+        thumbnails.shutdown_executor()
+        pdf.shutdown_executor()
+        await browser_pool.close()
+        await image_downloader.close()
+        await http_parser.close_session()
+
+    statuses = Counter(status for status, _ in outcomes)
+    latencies = [seconds for status, seconds in outcomes if status == "success"]
+    first_replies = [
+        update.message.first_reply_at - update.message.sent_at
+        for update in updates
+        if update.message.first_reply_at is not None
+    ]
+    own, children = peak_rss()
+    report.update(
+        {
+            "elapsed_s": elapsed,
+            "statuses": dict(statuses),
+            "error_rate": (statuses["error"] + statuses["timeout"]) / messages,
+            "throughput_per_min": statuses["success"] / elapsed * 60,
+            "latency_ms": {
+                f"p{p}": (percentile(latencies, p) or 0) * 1000 for p in (50, 95, 99)
+            },
+            "max_latency_ms": max(latencies, default=0) * 1000,
+            "first_reply_p95_ms": (percentile(first_replies, 95) or 0) * 1000,
+            "peak": dict(sampler.peak),
+            "peak_rss_self_bytes": own,
+            "peak_rss_child_bytes": children,
+        }
+    )
+    return report
+
+
+async def _wait_outcome(message, timeout):
+    remaining = message.sent_at + timeout - time.perf_counter()
+    try:
+        return await asyncio.wait_for(asyncio.shield(message.outcome), max(remaining, 0))
+    except asyncio.TimeoutError:
+        return "timeout", timeout
@@ -0,0 +1,260 @@
+import logging
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+from django.conf import settings
+
+from bot import http_parser, pdf, thumbnails
+from bot.bench.fakes import FakeUpdate
+from bot.bench.fixtures import IMAGE_VARIANTS, FixtureServer, sample_listings
+from bot.browser_pool import browser_pool
+from bot.downloader import image_downloader
+from bot.handlers import process_and_send_pdf
+from bot.image_cache import image_cache
+from bot.parser import download_all_images, parse_avito
+
+logger = logging.getLogger(__name__)
+
+BENCHMARKS = ["extraction", "downloads", "pdf", "e2e"]
+BACKENDS = ["browser", "http", "auto"]
+
+# Параметры прогона, по которым сопоставляются замеры разных ревизий
+KEY_PARAMS = ("backend", "size", "limit", "image_count")
+
+# Настройки, от которых зависят результаты; сохраняются вместе с замерами
+RECORDED_SETTINGS = [
+    "PARSER_BACKEND",
+    "PARSER_EXTRACTION",
+    "BROWSER_POOL_SIZE",
+    "BROWSER_HEADLESS",
+    "CRAWL_TABS",
+    "IMAGE_DOWNLOAD_CONCURRENCY",
+    "THUMBNAIL_WORKERS",
+    "PDF_WORKERS",
+    "SEARCH_LIMIT",
+]
+
+
+def summarize(name, timings, items=None, **extra):
+    """
+    Сводка по замерам одного бенчмарка в миллисекундах.
+
+    :param name: Название бенчмарка.
+    :param timings: Длительности прогонов в секундах.
+    :param items: Сколько объявлений/картинок обработано за прогон.
+    :param extra: Параметры прогона, сохраняются как есть.
+    """
+    result = {
+        "name": name,
+        **extra,
+        "runs": len(timings),
+        "min_ms": min(timings) * 1000,
+        "median_ms": statistics.median(timings) * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+    }
+    if items:
+        result["items"] = items
+        result["per_item_ms"] = result["median_ms"] / items
+    return result
+
+
+async def measure(run, repeat):
+    """
+    :param run: Корутина-функция run(attempt), выполняющая один прогон.
+    :param repeat: Количество прогонов.
+    :return: Длительности прогонов в секундах.
+    """
+    timings = []
+    for attempt in range(repeat):
+        started = time.perf_counter()
+        await run(attempt)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+# ---------------------------------------------------------------------
+# Бенчмарки горячих путей
+# ---------------------------------------------------------------------
+# Каждый прогон использует свою ссылку, чтобы не попадать в кэш
+# результатов поиска и в кэш картинок.
+
+
+async def bench_extraction(server, repeat, limit, backend, **options):
+    async def run(attempt):
+        url = server.url(f"/moskva/telefony?q=bench&run=extraction-{attempt}")
+        listings = await parse_avito(url, limit=limit, backend=backend)
+        if len(listings) < limit:
+            raise RuntimeError(f"Извлечено {len(listings)} объявлений из {limit}")
+
+    return [
+        summarize(
+            "extraction", await measure(run, repeat), items=limit, limit=limit, backend=backend
+        )
+    ]
+
+
+async def bench_downloads(server, repeat, image_count, **options):
+    async def run(attempt):
+        urls = [
+            server.url(f"/images/{i % IMAGE_VARIANTS}.jpg?item={attempt}-{i}")
+            for i in range(image_count)
+        ]
+        images = await download_all_images(urls)
+        failed = images.count(None)
+        if failed:
+            raise RuntimeError(f"Не загружено {failed} картинок из {image_count}")
+
+    return [
+        summarize(
+            "downloads",
+            await measure(run, repeat),
+            items=image_count,
+            image_count=image_count,
+            latency_ms=server.latency * 1000,
+        )
+    ]
+
+
+async def bench_pdf(server, repeat, pdf_sizes, **options):
+    results = []
+    for size in pdf_sizes:
+        pics, listings = sample_listings(size)
+        sizes = []
+
+        async def run(attempt):
+            sizes.append(len(await pdf.generate_pdf_file(pics, listings)))
+
+        timings = await measure(run, repeat)
+        results.append(summarize("pdf", timings, items=size, size=size, bytes=sizes[-1]))
+    return results
+
+
+async def bench_e2e(server, repeat, limit, backend, **options):
+    async def run(attempt):
+        update = FakeUpdate(server.url(f"/moskva/telefony?q=bench&run=e2e-{attempt}"))
+        await process_and_send_pdf(update, update.message.text)
+        if not update.message.documents:
+            raise RuntimeError(f"PDF не отправлен, ответы бота: {update.message.replies}")
+
+    return [
+        summarize("e2e", await measure(run, repeat), items=limit, limit=limit, backend=backend)
+    ]
+
+
+RUNNERS = {
+    "extraction": bench_extraction,
+    "downloads": bench_downloads,
+    "pdf": bench_pdf,
+    "e2e": bench_e2e,
+}
+
+
+# ---------------------------------------------------------------------
+# Прогон набора
+# ---------------------------------------------------------------------
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_suite(
+    names,
+    repeat=3,
+    limit=None,
+    image_count=50,
+    pdf_sizes=(50, 200, 1000),
+    latency=0.0,
+    backend="browser",
+):
+    """
+    Запускает выбранные бенчмарки против локального FixtureServer.
+    Ошибка одного бенчмарка записывается в результаты и не прерывает остальные.
+
+    :param names: Названия бенчмарков из BENCHMARKS.
+    :param repeat: Прогонов на каждый замер.
+    :param limit: Объявлений на поиск, по умолчанию settings.SEARCH_LIMIT.
+    :param image_count: Картинок в бенчмарке загрузки.
+    :param pdf_sizes: Количество объявлений в PDF.
+    :param latency: Задержка ответа сервера на картинку в секундах.
+    :param backend: Как получать выдачу в extraction и e2e: "browser",
+        "http" или "auto" (см. PARSER_BACKEND). Входит в ключ сравнения.
+    :return: Словарь с описанием окружения и результатами, готовый для JSON.
+    """
+    limit = limit or settings.SEARCH_LIMIT
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {name: getattr(settings, name) for name in RECORDED_SETTINGS},
+        "backend": backend,
+        "results": [],
+    }
+
+    # Замеряется путь через сеть, а не дисковый кэш. e2e проходит через
+    # обработчик бота, поэтому способ получения выдачи задаётся настройкой
+    cache_enabled, image_cache.enabled = image_cache.enabled, False
+    parser_backend, settings.PARSER_BACKEND = settings.PARSER_BACKEND, backend
+    try:
+        async with FixtureServer(per_page=settings.AVITO_PAGE_SIZE, latency=latency) as server:
+            for name in names:
+                logger.info(f"Бенчмарк {name}...")
+                try:
+                    report["results"] += await RUNNERS[name](
+                        server,
+                        repeat,
+                        limit=limit,
+                        image_count=image_count,
+                        pdf_sizes=pdf_sizes,
+                        backend=backend,
+                    )
+                except Exception as e:
+                    logger.exception(f"Бенчмарк {name} завершился с ошибкой: {e}")
+                    report["results"].append({"name": name, "error": repr(e)})
+            report["requests"] = dict(server.requests)
+    finally:
+        image_cache.enabled = cache_enabled
+        settings.PARSER_BACKEND = parser_backend
+        # Дочерние процессы пулов наследуют каналы драйвера Playwright,
+        # поэтому пулы останавливаются раньше браузеров
+        thumbnails.shutdown_executor()
+        pdf.shutdown_executor()
+        await browser_pool.close()
+        await image_downloader.close()
+        await http_parser.close_session()
+
+    return report
+
+
+def compare(report, baseline):
+    """
+    Сопоставляет медианы с предыдущим прогоном.
+
+    :return: Список (ключ замера, было мс, стало мс, изменение в %).
+    """
+
+    def key(result):
+        params = {k: v for k, v in result.items() if k in KEY_PARAMS}
+        return result["name"] + "".join(f" {k}={v}" for k, v in sorted(params.items()))
+
+    before = {key(r): r["median_ms"] for r in baseline["results"] if "median_ms" in r}
+    rows = []
+    for result in report["results"]:
+        if "median_ms" in result and key(result) in before:
+            old, new = before[key(result)], result["median_ms"]
+            rows.append((key(result), old, new, (new - old) / old * 100))
+    return rows
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from playwright.async_api import async_playwright
+
+from bot.metrics import count
+from bot.profiles import profile_store
+from bot.request_filter import make_request_filter
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать закрытия контекста; браузер, который не закрыл контекст
+# за это время, считается зависшим и перезапускается
+CONTEXT_CLOSE_TIMEOUT = 10
+
+
+# ---------------------------------------------------------------------
+# Слот пула: один запущенный браузер и его счётчики
+# ---------------------------------------------------------------------
+
+
+class _BrowserSlot:
+    def __init__(self, index, browser):
+        self.index = index
+        self.browser = browser
+        self.jobs = 0
+        self.active = 0
+        self.retired = False
+
+    @property
+    def healthy(self):
+        return not self.retired and self.browser.is_connected()
+
+
+# ---------------------------------------------------------------------
+# Пул долгоживущих браузеров Chromium
+# ---------------------------------------------------------------------
+
+
+class BrowserPool:
+    """
+    Держит N прогретых браузеров Chromium и выдаёт каждому поиску
+    изолированный контекст со своей страницей.
+
+    Браузер пересоздаётся после max_jobs задач или если он упал.
+    Пул запускается лениво при первом обращении, либо явно через start().
+
+    У каждого места пула свой профиль (см. ProfileStore): контексты
+    начинают с сохранённых cookies и localStorage, а после успешного
+    поиска сохраняют их обратно. Перезапущенный браузер продолжает
+    с тем же профилем.
+    """
+
+    def __init__(self, size=2, max_jobs=50, headless=False):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.headless = headless
+        self._playwright = None
+        self._slots = []
+        self._profiles = []
+        # Все незакрытые браузеры, включая заменённые, на которых ещё идут задачи
+        self._open = set()
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self):
+        return self._playwright is not None
+
+    async def start(self):
+        """
+        Запускает Playwright и N браузеров. Повторный вызов ничего не делает.
+        """
+        async with self._lock:
+            if self.started:
+                return
+            # Состояние пула меняется, только если запустились все браузеры,
+            # иначе следующий вызов start() пробует заново
+            playwright = await async_playwright().start()
+            profiles = []
+            slots = []
+            try:
+                for i in range(self.size):
+                    profiles.append(profile_store.acquire())
+                    slots.append(await self._launch(i, playwright))
+            except BaseException:
+                for slot in slots:
+                    await self._close_browser(slot)
+                for profile in profiles:
+                    if profile is not None:
+                        profile.release()
+                await playwright.stop()
+                raise
+            self._playwright = playwright
+            self._profiles = profiles
+            self._slots = slots
+            logger.info(
+                f"Пул браузеров запущен: {self.size} шт., headless={self.headless}"
+            )
+
+    async def close(self):
+        """
+        Закрывает все браузеры и останавливает Playwright.
+        """
+        async with self._lock:
+            if not self.started:
+                return
+            # Включая заменённые браузеры, на которых ещё идут задачи
+            for slot in list(self._open):
+                await self._close_browser(slot)
+            self._slots = []
+            for profile in self._profiles:
+                if profile is not None:
+                    profile.release()
+            self._profiles = []
+            await self._playwright.stop()
+            self._playwright = None
+            logger.info("Пул браузеров остановлен")
+
+    async def _launch(self, index, playwright=None):
+        playwright = playwright or self._playwright
+        browser = await playwright.chromium.launch(headless=self.headless)
+        logger.debug(f"Браузер #{index} запущен")
+        slot = _BrowserSlot(index, browser)
+        self._open.add(slot)
+        return slot
+
+    async def _close_browser(self, slot):
+        if slot not in self._open:
+            return
+        self._open.discard(slot)
+        try:
+            await slot.browser.close()
+        except Exception as e:
+            logger.warning(f"Ошибка при закрытии браузера #{slot.index}: {e}")
+
+    def stats(self):
+        """
+        :return: Сколько браузеров запущено и сколько контекстов открыто.
+        """
+        return {
+            "browsers": len(self._open),
+            "contexts": sum(slot.active for slot in self._open),
+        }
+
+    async def _acquire_slot(self):
+        """
+        Выбирает наименее загруженный живой браузер. Упавшие и отработавшие
+        свой лимит браузеры заменяются новыми, старые закрываются,
+        когда на них не останется активных задач.
+        """
+        if not self.started:
+            await self.start()
+
+        async with self._lock:
+            for i, slot in enumerate(self._slots):
+                if slot.healthy and slot.jobs < self.max_jobs:
+                    continue
+                if not slot.browser.is_connected():
+                    reason = "упал"
+                elif slot.retired:
+                    reason = "завис"
+                else:
+                    reason = "отработал лимит"
+                logger.info(f"Браузер #{slot.index} {reason}, перезапускаем")
+                slot.retired = True
+                if slot.active == 0:
+                    await self._close_browser(slot)
+                self._slots[i] = await self._launch(slot.index)
+
+            slot = min(self._slots, key=lambda s: s.active)
+            slot.jobs += 1
+            slot.active += 1
+            return slot
+
+    async def _release_slot(self, slot):
+        slot.active -= 1
+        if slot.retired and slot.active == 0:
+            await self._close_browser(slot)
+
+    @asynccontextmanager
+    async def context(self, block_requests=True, **context_options):
+        """
+        Выдаёт новый изолированный контекст браузера. В одном контексте
+        можно открыть несколько вкладок. Контекст закрывается при выходе
+        из блока, даже при ошибке или отмене задачи.
+
+        :param block_requests: Прерывать лишние запросы страниц
+            (см. RequestFilter и settings.REQUEST_BLOCKING).
+        :param context_options: Параметры для browser.new_context().
+        """
+        request_filter = make_request_filter() if block_requests else None
+        if request_filter is not None:
+            # Запросы из service worker не проходят через context.route
+            context_options.setdefault("service_workers", "block")
+
+        slot = await self._acquire_slot()
+        profile = self._profiles[slot.index]
+        context = None
+        try:
+            if profile is not None:
+                state = await asyncio.to_thread(profile.state)
+                context_options.setdefault("storage_state", state)
+                count("search_profile_total", state="warm" if state else "cold")
+            context = await slot.browser.new_context(**context_options)
+            if request_filter is not None:
+                await request_filter.attach(context)
+            yield context
+            if profile is not None:
+                await profile.save(context)
+        finally:
+            if context is not None:
+                try:
+                    await asyncio.wait_for(context.close(), CONTEXT_CLOSE_TIMEOUT)
+                except Exception as e:
+                    logger.warning(f"Ошибка при закрытии контекста: {e!r}")
+                    slot.retired = True
+            await self._release_slot(slot)
+            if request_filter is not None:
+                request_filter.report()
+
+    @asynccontextmanager
+    async def page(self, block_requests=True, **context_options):
+        """
+        Выдаёт страницу в новом изолированном контексте браузера.
+
+        :param block_requests: Прерывать лишние запросы страницы.
+        :param context_options: Параметры для browser.new_context().
+        """
+        async with self.context(block_requests, **context_options) as context:
+            yield await context.new_page()
+
+
+browser_pool = BrowserPool(
+    size=settings.BROWSER_POOL_SIZE,
+    max_jobs=settings.BROWSER_MAX_JOBS,
+    headless=settings.BROWSER_HEADLESS,
+)
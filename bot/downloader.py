@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import random
+import ssl
+
+import aiohttp
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Статусы, при которых имеет смысл повторить запрос
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------
+# Общий на процесс загрузчик картинок
+# ---------------------------------------------------------------------
+
+
+class ImageDownloader:
+    """
+    Загружает картинки через одну aiohttp-сессию на процесс.
+
+    Соединения к CDN переиспользуются (keep-alive, кэш DNS), число
+    одновременных загрузок ограничено семафором, временные ошибки
+    повторяются с экспоненциальной задержкой.
+    """
+
+    def __init__(
+        self,
+        concurrency=16,
+        limit_per_host=8,
+        max_bytes=5 * 1024 * 1024,
+        retries=2,
+        timeout=10,
+        backoff=0.5,
+    ):
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host
+        self.max_bytes = max_bytes
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+
+            connector = aiohttp.TCPConnector(
+                ssl=ssl_context,
+                limit=self.concurrency,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=300,
+                keepalive_timeout=30,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _read_limited(self, response):
+        if response.content_length and response.content_length > self.max_bytes:
+            raise ResponseTooLarge(f"{response.content_length} байт")
+
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise ResponseTooLarge(f"больше {self.max_bytes} байт")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def fetch(self, url):
+        """
+        Загружает тело ответа по URL.
+
+        :param url: Ссылка на ресурс.
+        :return: Байты ответа или None, если загрузка не удалась.
+        """
+        for attempt in range(self.retries + 1):
+            # Место семафора занято только на время запроса: пока загрузка
+            # ждёт повтора (например, после 429), идут другие загрузки
+            async with self._semaphore:
+                try:
+                    async with self.session.get(url) as response:
+                        if response.status == 200:
+                            return await self._read_limited(response)
+                        if response.status not in RETRY_STATUSES:
+                            logger.warning(
+                                f"Ошибка загрузки {url}: статус {response.status}"
+                            )
+                            return None
+                        error = f"статус {response.status}"
+                except ResponseTooLarge as e:
+                    logger.warning(f"Ошибка загрузки {url}: ответ слишком большой, {e}")
+                    return None
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = repr(e)
+
+            if attempt < self.retries:
+                delay = self.backoff * 2**attempt * (1 + random.random())
+                logger.debug(
+                    f"Повтор загрузки {url} через {delay:.2f}с ({error})"
+                )
+                await asyncio.sleep(delay)
+
+        logger.warning(f"Ошибка загрузки {url}: {error}")
+        return None
+
+
+image_downloader = ImageDownloader(
+    concurrency=settings.IMAGE_DOWNLOAD_CONCURRENCY,
+    limit_per_host=settings.IMAGE_DOWNLOAD_PER_HOST,
+    max_bytes=settings.IMAGE_MAX_BYTES,
+    retries=settings.IMAGE_DOWNLOAD_RETRIES,
+    timeout=settings.IMAGE_DOWNLOAD_TIMEOUT,
+)
@@ -1,34 +1,60 @@
 import asyncio
-import os
 import logging
 
 from asgiref.sync import sync_to_async
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph
-from reportlab.lib import colors
+from django.conf import settings
+from django.db import DatabaseError
 
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from bot.image_cache import image_cache
+from bot.listing import Listing
+from bot.metrics import LOG_FORMAT, stage, track_job
 from bot.models import TelegramUser
-from bot.parser import parse_avito
+from bot.result_cache import result_cache
+from bot.scheduler import QueueFull, scheduler
+from bot.storage import load_recent_listings, save_listings
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
-)
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
-# ---------------------------------------------------------------------
-# Настройка логов
-# ---------------------------------------------------------------------
-FONT_PATH_REG = os.path.join("fonts/open-sans", "OpenSans-Regular.ttf")
-FONT_PATH_BOLD = os.path.join("fonts/open-sans", "OpenSans-Bold.ttf")
-pdfmetrics.registerFont(TTFont("OpenSans", FONT_PATH_REG))
-pdfmetrics.registerFont(TTFont("OpenSansBold", FONT_PATH_BOLD))
+JOB_STATES = {
+    "PENDING": "в очереди",
+    "STARTED": "выполняется",
+    "PROGRESS": "выполняется",
+    "SUCCESS": "готово",
+    "FAILURE": "ошибка",
+    "RETRY": "повтор",
+    "REVOKED": "отменена",
+}
+JOB_STAGES = {
+    "parsing": "поиск на Avito",
+    "preview": "поиск на Avito, первые результаты отправлены",
+    "images": "загрузка картинок",
+    "pdf": "генерация PDF",
+    "sending": "отправка",
+}
+
+ERROR_REPLY = "Произошла непредвиденная ошибка, попробуйте позже"
+TIMEOUT_REPLY = "Поиск не уложился в отведённое время и остановлен, попробуйте позже"
+SUPERSEDED_REPLY = "Предыдущий запрос отменён, выполняю новый."
+
+# ID пользователей, которые уже есть в БД. Повторные /start не ходят в БД
+_known_users = set()
+
+
+async def register_user(telegram_id):
+    """
+    Создаёт запись пользователя в БД, если её ещё нет.
+    """
+    if telegram_id in _known_users:
+        return
+    _, created = await TelegramUser.objects.aget_or_create(telegram_id=telegram_id)
+    if created:
+        logger.info(f"Новый пользователь {telegram_id}")
+    _known_users.add(telegram_id)
+
 
 # ---------------------------------------------------------------------
 # Функция для обработки команды /start
@@ -42,200 +68,242 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     """
     logger.info(f"Пользователь {update.effective_user.id} вызвал /start")
 
-    await sync_to_async(TelegramUser.objects.get_or_create)(
-        telegram_id=update.effective_user.id,
-    )
+    await register_user(update.effective_user.id)
     await update.message.reply_text(
         "Привет! Я твой бот-помощник. Введите ссылку, а я постараюсь найти для вас варианты."
     )
 
 
 # ---------------------------------------------------------------------
-# Функция для переноса текста в пдф файле
+# Функция обрабатывающая запрос пользователя и возвращающая готовый пдф файл
 # ---------------------------------------------------------------------
-
-
-def wrap_text(c, text, x, y, max_width, test_mode=False):
-    """
-    Оборачивает текст в заданной области.
-
-    :param c: Объект Canvas.
-    :param text: Текст.
-    :param x: Координата X.
-    :param y: Координата Y.
-    :param max_width: Максимальная ширина строки.
-    :param test_mode: Если True, просто рассчитывает высоту текста без отрисовки.
-    :return: Высота блока текста.
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
-    styles = getSampleStyleSheet()
-    style = styles["Normal"]
-    style.wordWrap = "CJK"
-    style.fontName = "OpenSans"
-    style.fontSize = 12
-    style.textColor = colors.black
-
-    p = Paragraph(text, style)
-    w, h = p.wrap(max_width, 1000)
-
-    if not test_mode:
-        p.drawOn(c, x, y - h)
-
-    return h
-
+    Обрабатывает текстовые сообщения от пользователя в Telegram.
 
-# ---------------------------------------------------------------------
-# Функция для создания фала в формате пдф
-# ---------------------------------------------------------------------
-async def generate_pdf_file(
-    pics_url_array, text_array, title_array, company_info, file_path="output.pdf"
-):
-    """
-    Создаёт PDF с изображениями и описаниями объявлений.
+    1. Получает текстовое сообщение от пользователя.
+    2. Запускает процесс парсинга Avito для поиска товаров по введённому запросу.
+    3. Генерирует PDF-файл с найденными объявлениями.
+    4. Отправляет PDF обратно пользователю в Telegram.
 
-    :param pics_url_array: Список объектов ImageReader.
-    :param title_array: Список заголовков объявлений.
-    :param text_array: Список текстов объявлений.
-    :param file_path: Имя файла.
-    :return: Путь к созданному PDF.
+    :param update: Объект обновления Telegram API, содержащий данные о входящем сообщении.
+    :param context: Контекст бота, содержащий дополнительную информацию.
     """
-    logger.info(f"Начинаем генерацию PDF: {file_path}")
-
-    page_width, page_height = A4
-    c = canvas.Canvas(file_path, pagesize=A4)
-
-    cols = 5
-    padding_x = 2
-    padding_y = 2
-    img_height = 77
-    img_width = ((page_width - 77) - (cols - 1) * padding_x) / cols
-
-    c.setFont("OpenSans", 14)
-    c.drawString(40, page_height - 30, "Изображения по запросу: ")
-
-    y_start = page_height - img_height - 40
-    x_start = 100
-
-    for i, url in enumerate(pics_url_array):
-        col = i % cols
-        row = i // cols
-
-        x = x_start + col * (img_width - 23)
-        y = y_start - (row * (img_height + padding_y))
-
-        if url:
-            c.drawImage(
-                url, x, y, img_width, img_height, preserveAspectRatio=True, anchor="c"
-            )
+    message = update.message.text
+    logger.info(
+        f"Получено сообщение от пользователя {update.effective_user.id}: {message}"
+    )
 
-    c.showPage()
+    await update.message.reply_text(f"Вы сказали: {message}")
 
-    text_y = page_height - 50
-    max_text_width = page_width - 80
-    min_text_space = 50
-    first_page = True
+    if settings.SEARCH_BACKEND == "celery":
+        await update.message.reply_text("Произвожу поиск на Avito...")
+        await enqueue_search(update, message)
+        return
 
-    for idx, text in enumerate(text_array):
-        header_height = 20
+    # Новый запрос заменяет незавершённые запросы пользователя
+    if settings.SEARCH_SUPERSEDE and scheduler.cancel(update.effective_user.id):
+        await update.message.reply_text(SUPERSEDED_REPLY)
 
-        short_text = text[:100]
-        text_height_short = (
-            wrap_text(c, short_text, 40, text_y, max_text_width, test_mode=True) + 10
+    try:
+        position, wait = scheduler.submit(
+            update.effective_user.id, lambda: process_and_send_pdf(update, message)
         )
+    except QueueFull:
+        await update.message.reply_text(
+            "У вас уже слишком много запросов в очереди. "
+            "Дождитесь результатов и попробуйте снова."
+        )
+        return
 
-        long_text = text[:200]
-        text_height_long = (
-            wrap_text(c, long_text, 40, text_y, max_text_width, test_mode=True) + 10
+    if position:
+        await update.message.reply_text(
+            f"Ваш запрос в очереди: {position}-й, "
+            f"примерное ожидание {round(wait)} с."
         )
 
-        block_height = header_height + text_height_short + text_height_long
 
-        if not first_page and (text_y - block_height < min_text_space):
-            c.showPage()
-            text_y = page_height - 50
+# ---------------------------------------------------------------------
+# Конвейер поиска: парсинг, картинки, PDF
+# ---------------------------------------------------------------------
+async def _skip_notify(stage, text):
+    pass
 
-        first_page = False
 
-        c.setFont("OpenSansBold", 11)
-        header = f"Объявление {idx + 1}: {title_array[idx]}"
-        c.drawString(40, text_y, header)
-        text_y -= 10
+def format_preview(listings):
+    """
+    Короткое текстовое превью первых найденных объявлений.
+    """
+    lines = ["Первые результаты:"]
+    for i, listing in enumerate(listings[: settings.PREVIEW_SIZE]):
+        lines.append(f"{i + 1}. {listing.title} — {listing.price_text}")
+    lines.append("Полный отчёт в PDF будет готов чуть позже.")
+    return "\n".join(lines)
 
-        c.setFont("OpenSans", 10)
-        company_price = f"Цена: {company_info[idx][0]}"
-        h1 = wrap_text(c, company_price, 40, text_y, max_text_width)
-        text_y -= h1 + 10
 
-        c.setFont("OpenSans", 10)
-        company_name = f"Компания/ИП: {company_info[idx][1]}"
-        h1 = wrap_text(c, company_name, 40, text_y, max_text_width)
-        text_y -= h1 + 10
+async def build_report(message: str, notify=None, limit=None):
+    """
+    Выполняет поиск и собирает PDF-отчёт. Используется и ботом,
+    и воркерами Celery.
 
-        c.setFont("OpenSans", 10)
-        company_rating = f"Рейтинг: {company_info[idx][2]}"
-        h1 = wrap_text(c, company_rating, 40, text_y, max_text_width)
-        text_y -= h1 + 10
+    :param message: Ссылка на выдачу Avito.
+    :param notify: Корутина-функция notify(stage, text) для сообщений о ходе работы.
+    :param limit: Максимальное количество объявлений, по умолчанию settings.SEARCH_LIMIT.
+    :return: Содержимое PDF.
+    """
+    # Playwright, aiohttp, reportlab и Pillow загружаются при первом поиске
+    # (или заранее, в фоне после запуска бота), а не при импорте обработчиков
+    from bot.parser import download_all_images, stream_avito
+    from bot.pdf import IMG_HEIGHT, IMG_WIDTH, generate_pdf_file
+    from bot.thumbnails import thumbnail_images
+
+    notify = notify or _skip_notify
+    limit = limit or settings.SEARCH_LIMIT
+    query_key = result_cache.make_key(message, limit=limit)
+
+    preview_sent = False
+    # collect() выполняется в общей задаче кэша и может пережить этот
+    # запрос, если его отменили, а другие ждут того же результата
+    requester = asyncio.current_task()
+
+    async def send_preview(listings):
+        nonlocal preview_sent
+        if not preview_sent and listings:
+            preview_sent = True
+            await notify("preview", format_preview(listings))
+
+    async def send_early_preview(listings):
+        if requester.done() or requester.cancelling():
+            return
+        await send_preview(listings)
+
+    async def collect():
+        if settings.RESULT_DB_TTL:
+            try:
+                stored = await sync_to_async(load_recent_listings)(
+                    query_key, settings.RESULT_DB_TTL
+                )
+            except DatabaseError as e:
+                logger.warning(f"Не удалось прочитать результаты из БД: {e}")
+                stored = None
+            if stored:
+                logger.info(f"Результаты взяты из БД: {query_key}")
+                return [listing.to_dict() for listing in stored]
+
+        listings = []
+        async for listing in stream_avito(message, limit=limit):
+            listings.append(listing)
+            if len(listings) == settings.PREVIEW_SIZE:
+                await send_early_preview(listings)
+
+        try:
+            await sync_to_async(save_listings)(query_key, listings)
+        except DatabaseError as e:
+            logger.warning(f"Не удалось сохранить результаты в БД: {e}")
+        return [listing.to_dict() for listing in listings]
+
+    await notify("parsing", None)
+    listings = [
+        Listing.from_dict(data)
+        for data in await result_cache.get_or_fetch(message, collect, limit=limit)
+    ]
+    # Результат из кэша или из чужого парсинга: превью ещё не отправлялось
+    await send_preview(listings)
+
+    await notify("images", None)
+    images = await download_all_images([listing.image_url for listing in listings])
+    logger.info(f"Кэш картинок: {image_cache.stats()}")
+    with stage("thumbnails") as s:
+        thumbnails, stats = await thumbnail_images(images, IMG_WIDTH, IMG_HEIGHT)
+        s.items, s.bytes = stats.count, stats.bytes_out
+    logger.info(f"Картинки уменьшены: {stats}")
+
+    await notify("pdf", "Генерирую PDF...")
+    return await generate_pdf_file(thumbnails, listings)
 
-        c.setFont("OpenSans", 10)
-        company_reviews = f"Кол-во отзывов: {company_info[idx][3]}"
-        h1 = wrap_text(c, company_reviews, 40, text_y, max_text_width)
-        text_y -= h1 + 10
 
-        c.setFont("OpenSans", 10)
-        h1 = wrap_text(c, short_text, 40, text_y, max_text_width)
-        text_y -= h1 + 10
+async def process_and_send_pdf(update: Update, message: str):
+    async def notify(stage, text):
+        if text:
+            await update.message.reply_text(text)
 
-        c.setFont("OpenSans", 10)
-        h2 = wrap_text(c, long_text, 40, text_y, max_text_width)
-        text_y -= h2 + 30
+    await update.message.reply_text("Произвожу поиск на Avito...")
+    # Отмена (/cancel, новый запрос) приходит сюда как CancelledError:
+    # вкладки и контексты браузера закрываются в finally внутри build_report
+    async with track_job() as job:
+        try:
+            async with asyncio.timeout(settings.SEARCH_JOB_TIMEOUT):
+                pdf = await build_report(message, notify)
+                with stage("upload", size=len(pdf)):
+                    await update.message.reply_document(pdf, filename="output.pdf")
+        except TimeoutError:
+            job.status = "timeout"
+            logger.warning(
+                f"Запрос {message} не уложился в {settings.SEARCH_JOB_TIMEOUT} с"
+            )
+            await update.message.reply_text(TIMEOUT_REPLY)
+            return
+        except Exception as e:
+            job.status = "error"
+            logger.exception(f"Ошибка при обработке запроса {message}: {e}")
+            await update.message.reply_text(ERROR_REPLY)
+            return
 
-    c.save()
-    logger.info(f"PDF успешно сгенерирован: {file_path}")
-    return file_path
+        logger.info("PDF отправлен пользователю")
 
 
 # ---------------------------------------------------------------------
-# Функция обрабатывающая запрос пользователя и возвращающая готовый пдф файл
+# Очередь задач Celery
 # ---------------------------------------------------------------------
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def enqueue_search(update: Update, message: str):
     """
-    Обрабатывает текстовые сообщения от пользователя в Telegram.
-
-    1. Получает текстовое сообщение от пользователя.
-    2. Запускает процесс парсинга Avito для поиска товаров по введённому запросу.
-    3. Генерирует PDF-файл с найденными объявлениями.
-    4. Отправляет PDF обратно пользователю в Telegram.
-
-    :param update: Объект обновления Telegram API, содержащий данные о входящем сообщении.
-    :param context: Контекст бота, содержащий дополнительную информацию.
+    Ставит поиск в очередь Celery. PDF отправит воркер.
     """
-    message = update.message.text
-    logger.info(
-        f"Получено сообщение от пользователя {update.effective_user.id}: {message}"
-    )
-
-    await update.message.reply_text(f"Вы сказали: {message}")
-    await update.message.reply_text("Произвожу поиск на Avito...")
+    from bot.tasks import search_job
 
+    job = await asyncio.to_thread(
+        search_job.delay,
+        update.effective_chat.id,
+        message,
+        update.message.message_id,
+    )
+    logger.info(f"Поиск поставлен в очередь, задача {job.id}")
+    await update.message.reply_text(
+        f"Запрос поставлен в очередь. Проверить статус: /status {job.id}"
+    )
 
 
-    try:
-        asyncio.create_task(process_and_send_pdf(update, message))
-    except Exception as e:
-        await update.message.reply_text("Произошла непредвиденная ошибка, попробуйте позже")
-        logger.error(f"Ошибка при запуске браузера: {e}")
+async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обрабатывает команду /cancel: отменяет поиски пользователя,
+    ожидающие в очереди и выполняемые.
+    """
+    if settings.SEARCH_BACKEND == "celery":
+        await update.message.reply_text(
+            "Поиски выполняются на воркерах и не отменяются, "
+            "проверить статус: /status <id>"
+        )
+        return
 
+    cancelled = scheduler.cancel(update.effective_user.id)
+    if cancelled:
+        await update.message.reply_text(f"Отменено запросов: {cancelled}")
+    else:
+        await update.message.reply_text("Нет запросов, которые можно отменить")
 
-async def process_and_send_pdf(update: Update, message: str):
-    pics_results, text_results, title_results, company_info = await parse_avito(
-        message, limit=50
-    )
 
-    await update.message.reply_text("Генерирую PDF...")
-    pdf_path = await generate_pdf_file(
-        pics_results, text_results, title_results, company_info, "output.pdf"
-    )
+async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обрабатывает команду /status <id задачи> и сообщает, на каком этапе задача.
+    """
+    if not context.args:
+        await update.message.reply_text("Укажите номер задачи: /status <id>")
+        return
 
-    with open(pdf_path, "rb") as doc:
-        await update.message.reply_document(doc, filename="output.pdf")
+    from bot.tasks import get_job_status
 
-    logger.info("PDF отправлен пользователю")
+    state, stage = await asyncio.to_thread(get_job_status, context.args[0])
+    text = JOB_STATES.get(state, state)
+    if stage:
+        text += f" ({JOB_STAGES.get(stage, stage)})"
+    await update.message.reply_text(f"Статус задачи: {text}")
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import logging
+import re
+from html import unescape
+from html.parser import HTMLParser
+from urllib.parse import unquote, urljoin
+
+import aiohttp
+from django.conf import settings
+
+from bot.listing import Listing, parse_price
+from bot.metrics import stage
+from bot.parser import CARD_FIELDS, CARD_SELECTOR, build_listing, page_url
+
+logger = logging.getLogger(__name__)
+
+# Заголовки обычного браузера: без них Avito чаще отвечает 403/429
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8",
+}
+
+_SCRIPT_RE = re.compile(r"<script\b[^>]*>(.*?)</script>", re.S | re.I)
+# Старый формат состояния: window.__initialData__ = "<urlencoded JSON>"
+_INITIAL_DATA_RE = re.compile(r'__initialData__\s*=\s*"(.*?)"\s*;', re.S)
+
+# Элементы, вокруг которых innerText ставит перенос строки
+BLOCK_TAGS = {"div", "p", "li", "ul", "ol", "section", "article", "header", "footer", "br"}
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "wbr",
+}
+
+
+class FastPathError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------
+# Минимальное DOM-дерево для селекторов из CARD_FIELDS
+# ---------------------------------------------------------------------
+
+
+class Node:
+    __slots__ = ("tag", "attrs", "classes", "children", "parent")
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.classes = set((attrs.get("class") or "").split())
+        self.children = []
+        self.parent = parent
+
+    def iter(self):
+        for child in self.children:
+            if isinstance(child, Node):
+                yield child
+                yield from child.iter()
+
+    def text(self):
+        """
+        Текст элемента, близкий к innerText: блочные элементы
+        с новой строки, пустые строки убраны.
+        """
+        parts = []
+        self._collect_text(parts)
+        lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+    def _collect_text(self, parts):
+        for child in self.children:
+            if isinstance(child, str):
+                parts.append(child)
+            elif child.tag in BLOCK_TAGS:
+                parts.append("\n")
+                child._collect_text(parts)
+                parts.append("\n")
+            else:
+                child._collect_text(parts)
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#root", {}, None)
+        self._current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, dict(attrs), self._current)
+        self._current.children.append(node)
+        if tag not in VOID_TAGS:
+            self._current = node
+
+    def handle_endtag(self, tag):
+        node = self._current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self._current = node.parent
+
+    def handle_data(self, data):
+        if self._current.tag not in ("script", "style"):
+            self._current.children.append(data)
+
+
+def _parse_simple_selector(part):
+    tag, *classes = part.split(".")
+    return tag or None, set(classes)
+
+
+def _matches(node, simple):
+    tag, classes = simple
+    return (tag is None or node.tag == tag) and classes <= node.classes
+
+
+def select(root, selector):
+    """
+    Элементы внутри root по селектору из потомков вида "div.a p" -
+    только теги, классы и пробел между ними, как в CARD_FIELDS.
+    """
+    *ancestors, last = [_parse_simple_selector(part) for part in selector.split()]
+    found = []
+    for node in root.iter():
+        if not _matches(node, last):
+            continue
+        remaining = list(ancestors)
+        parent = node.parent
+        while remaining and parent is not None and parent is not root.parent:
+            if _matches(parent, remaining[-1]):
+                remaining.pop()
+            parent = parent.parent
+        if not remaining:
+            found.append(node)
+    return found
+
+
+def extract_cards_html(html, base_url):
+    """
+    Извлекает карточки из серверного HTML по тем же CARD_SELECTOR
+    и CARD_FIELDS, что и браузерный режим.
+
+    :return: Список словарей с сырыми полями карточек.
+    """
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+
+    records = []
+    for card in select(builder.root, CARD_SELECTOR):
+        record = {}
+        for name, (selector, attr) in CARD_FIELDS.items():
+            found = select(card, selector)
+            if not found:
+                record[name] = None
+            elif attr == "text":
+                record[name] = found[0].text()
+            else:
+                value = found[0].attrs.get(attr)
+                record[name] = urljoin(base_url, value) if value else None
+        records.append(record)
+    return records
+
+
+# ---------------------------------------------------------------------
+# Встроенное в страницу состояние (JSON)
+# ---------------------------------------------------------------------
+
+
+def _json_blobs(html):
+    for match in _INITIAL_DATA_RE.finditer(html):
+        try:
+            yield json.loads(unquote(match.group(1)))
+        except ValueError:
+            continue
+    for match in _SCRIPT_RE.finditer(html):
+        body = match.group(1).strip()
+        if body[:1] in ("{", "[") and len(body) > 2:
+            try:
+                yield json.loads(unescape(body) if "&quot;" in body else body)
+            except ValueError:
+                continue
+
+
+def _find_item_lists(data, depth=0):
+    """
+    Ищет в состоянии списки объявлений: словари с id, заголовком и ссылкой.
+    """
+    if depth > 12:
+        return
+    if isinstance(data, list):
+        items = [x for x in data if isinstance(x, dict) and "id" in x and "title" in x]
+        if items and any("urlPath" in x or "url" in x for x in items):
+            yield items
+            return
+        for value in data:
+            yield from _find_item_lists(value, depth + 1)
+    elif isinstance(data, dict):
+        for value in data.values():
+            yield from _find_item_lists(value, depth + 1)
+
+
+def _pick_image(item):
+    images = item.get("images") or (item.get("gallery") or {}).get("images") or []
+    if not images:
+        return None
+    image = images[0]
+    if isinstance(image, str):
+        return image
+    if isinstance(image, dict):
+        # {"208x156": url, "472x354": url, ...} - берём самую большую
+        sized = {k: v for k, v in image.items() if re.fullmatch(r"\d+x\d+", k)}
+        if sized:
+            return sized[max(sized, key=lambda k: int(k.split("x")[0]))]
+        return image.get("url") or image.get("src")
+    return None
+
+
+def _item_to_listing(item, base_url):
+    detailed = item.get("priceDetailed") or {}
+    price = detailed.get("value") if isinstance(detailed, dict) else detailed
+    if price is None:
+        price = item.get("price")
+    price_raw = detailed.get("string") if isinstance(detailed, dict) else None
+    if price_raw is None and isinstance(price, str):
+        price_raw = price
+    user = item.get("userInfo") or item.get("seller") or {}
+    rating = user.get("rating") or user.get("ratingValue")
+    reviews = user.get("reviewCount") or user.get("reviewsCount")
+    url = item.get("urlPath") or item.get("url") or ""
+    return Listing(
+        id=str(item["id"]),
+        url=urljoin(base_url, url),
+        title=str(item.get("title") or "").strip(),
+        price=price if isinstance(price, int) else parse_price(str(price or "")),
+        price_raw=str(price_raw or "").strip(),
+        seller=str(user.get("title") or user.get("name") or "Не предоставили").strip(),
+        rating=float(str(rating).replace(",", ".")) if rating else None,
+        reviews=int(reviews) if str(reviews or "").isdigit() else None,
+        text=str(item.get("description") or "").strip(),
+        image_url=_pick_image(item),
+    )
+
+
+def extract_embedded_listings(html, base_url):
+    """
+    :return: Объявления из самого длинного списка во встроенном JSON
+        или пустой список, если состояния нет.
+    """
+    best = []
+    for blob in _json_blobs(html):
+        for items in _find_item_lists(blob):
+            if len(items) > len(best):
+                best = items
+    listings = []
+    for item in best:
+        try:
+            listings.append(_item_to_listing(item, base_url))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.debug(f"Пропущен элемент состояния: {e!r}")
+    return listings
+
+
+# ---------------------------------------------------------------------
+# Загрузка выдачи без браузера
+# ---------------------------------------------------------------------
+
+
+# Своя сессия для страниц Avito: у сессии загрузчика картинок отключена
+# проверка сертификатов, а соединения настроены под CDN
+_session = None
+
+
+def get_session():
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(ttl_dns_cache=300, keepalive_timeout=30)
+        )
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def fetch_page(url, timeout=None):
+    """
+    :return: HTML страницы.
+    :raises FastPathError: Если страница не получена.
+    """
+    timeout = aiohttp.ClientTimeout(total=timeout or settings.HTTP_FETCH_TIMEOUT)
+    try:
+        async with get_session().get(url, headers=HEADERS, timeout=timeout) as response:
+            if response.status != 200:
+                raise FastPathError(f"{url}: HTTP {response.status}")
+            return await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise FastPathError(f"{url}: {e!r}") from e
+    except (UnicodeDecodeError, LookupError) as e:
+        # Неверная или неизвестная кодировка страницы
+        raise FastPathError(f"{url}: {e!r}") from e
+
+
+def extract_listings(html, base_url):
+    """
+    Объявления страницы: из встроенного JSON, а если его нет или в HTML
+    карточек больше - из разметки карточек.
+    """
+    embedded = extract_embedded_listings(html, base_url)
+    records = extract_cards_html(html, base_url)
+    if len(embedded) >= len(records):
+        return embedded
+    return [build_listing(raw) for raw in records]
+
+
+async def fetch_listings(search_url, limit, pages):
+    """
+    Загружает страницы выдачи 1..pages параллельно и извлекает объявления
+    без браузера. Повторы между страницами отбрасываются.
+
+    Разбор HTML написан на чистом Python и занимает до секунды на страницу,
+    поэтому выполняется в потоках, чтобы не останавливать event loop.
+
+    :return: Список объектов Listing (не больше limit).
+    :raises FastPathError: Если не удалось загрузить ни одной страницы.
+    """
+    urls = [page_url(search_url, number) for number in range(1, pages + 1)]
+    with stage("http_fetch") as s:
+        results = await asyncio.gather(
+            *(fetch_page(url) for url in urls), return_exceptions=True
+        )
+        s.bytes = sum(len(html) for html in results if isinstance(html, str))
+
+    errors = [r for r in results if isinstance(r, Exception)]
+    if len(errors) == len(results):
+        raise errors[0]
+    for error in errors:
+        logger.warning(f"Страница не загружена без браузера: {error}")
+
+    listings = []
+    seen = set()
+    with stage("extract") as s:
+        pages = await asyncio.gather(
+            *(
+                asyncio.to_thread(extract_listings, html, url)
+                for url, html in zip(urls, results)
+                if not isinstance(html, Exception)
+            )
+        )
+        for page in pages:
+            for listing in page:
+                if listing.id in seen:
+                    continue
+                seen.add(listing.id)
+                listings.append(listing)
+        s.items = len(listings)
+    return listings[:limit]
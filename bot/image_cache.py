@@ -0,0 +1,157 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# Дисковый кэш картинок с адресацией по хэшу URL
+# ---------------------------------------------------------------------
+
+
+class ImageCache:
+    """
+    Хранит загруженные картинки на диске в файлах <sha256(url)>.
+
+    Запись атомарная (временный файл + os.replace), поэтому кэш можно
+    делить между несколькими процессами бота. Время последнего чтения
+    хранится в mtime файла; когда объём кэша превышает max_bytes,
+    удаляются самые давно использованные файлы (LRU).
+
+    Тем же классом кэшируется статика страниц выдачи (bot.profiles.asset_cache).
+    """
+
+    def __init__(self, directory, max_bytes, enabled=True, label="картинок"):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.label = label
+        self.hits = 0
+        self.misses = 0
+        self._written = 0
+
+    def _path(self, url):
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return self.directory / digest[:2] / digest
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    # -----------------------------------------------------------------
+    # Синхронные операции с файлами (выполняются в потоке)
+    # -----------------------------------------------------------------
+
+    def _read(self, path):
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def _write(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        self._written += len(data)
+        if self._written >= self.max_bytes // 20:
+            self._written = 0
+            self.evict()
+
+    def evict(self):
+        """
+        Удаляет самые старые файлы, пока кэш не уменьшится до 90% от
+        max_bytes. Одновременно чисткой занимается только один процесс.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            files = []
+            total = 0
+            for path in self.directory.glob("*/*"):
+                if path.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            target = self.max_bytes * 0.9
+            removed = 0
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            logger.info(f"Кэш {self.label} очищен: удалено {removed} файлов")
+
+    # -----------------------------------------------------------------
+    # Асинхронный интерфейс
+    # -----------------------------------------------------------------
+
+    async def get(self, url):
+        """
+        :param url: Ссылка на картинку.
+        :return: Байты картинки из кэша или None при промахе.
+        """
+        if not self.enabled:
+            return None
+        data = await asyncio.to_thread(self._read, self._path(url))
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    async def put(self, url, data):
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._write, self._path(url), data)
+        except OSError as e:
+            logger.warning(f"Не удалось записать в кэш {self.label}: {e}")
+
+
+image_cache = ImageCache(
+    settings.IMAGE_CACHE_DIR,
+    max_bytes=settings.IMAGE_CACHE_MAX_BYTES,
+    enabled=settings.IMAGE_CACHE_ENABLED,
+)
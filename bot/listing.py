@@ -0,0 +1,94 @@
+import re
+from dataclasses import asdict, dataclass
+
+NOT_PROVIDED = "Не предоставлено"
+
+# Первое число цены: "54 990", "1 500" в "1 500 – 2 000", "2,5 млн"
+_PRICE_RE = re.compile(r"(\d{1,3}(?:\s\d{3})+|\d+)([.,]\d+)?\s*(млн|тыс)?", re.IGNORECASE)
+_PRICE_MULTIPLIERS = {"тыс": 1_000, "млн": 1_000_000}
+_RATING_RE = re.compile(r"^\s*\d[.,]\d")
+_REVIEWS_RE = re.compile(r"(\d[\d ]*)\s*отзыв")
+
+
+# ---------------------------------------------------------------------
+# Разбор числовых полей карточки
+# ---------------------------------------------------------------------
+
+
+def parse_price(text):
+    """
+    "54 990 ₽" -> 54990. Из диапазона берётся нижняя граница:
+    "1 500 – 2 000 ₽" -> 1500, "2,5 млн ₽" -> 2500000.
+    Для "Цена не указана", "Бесплатно" и пустой строки - None.
+    """
+    match = _PRICE_RE.search(text or "")
+    if not match:
+        return None
+    number, fraction, unit = match.groups()
+    value = float(re.sub(r"\s", "", number) + (fraction or "").replace(",", "."))
+    return round(value * _PRICE_MULTIPLIERS.get((unit or "").lower(), 1))
+
+
+def parse_seller_stats(text):
+    """
+    Рейтинг и число отзывов из блока продавца без названия:
+    "4,8 127 отзывов" -> (4.8, 127), "Нет отзывов" -> (None, 0).
+    """
+    text = (text or "").replace("\xa0", " ")
+    rating = _RATING_RE.search(text)
+    reviews = _REVIEWS_RE.search(text, rating.end() if rating else 0)
+    if reviews:
+        reviews_count = int(re.sub(r"\D", "", reviews.group(1)))
+    elif "нет отзывов" in text.lower():
+        reviews_count = 0
+    else:
+        reviews_count = None
+    return (float(rating.group().replace(",", ".")) if rating else None), reviews_count
+
+
+# ---------------------------------------------------------------------
+# Объявление
+# ---------------------------------------------------------------------
+
+
+@dataclass(slots=True)
+class Listing:
+    """
+    Одно объявление из выдачи Avito. Используется от парсера до PDF
+    и сохраняется в БД моделью ScrapedListing.
+    """
+
+    id: str
+    url: str
+    title: str
+    price: int | None
+    seller: str
+    rating: float | None
+    reviews: int | None
+    text: str
+    image_url: str | None
+    # Цена как на сайте ("Бесплатно", "1 500 – 2 000 ₽"), показывается в отчёте
+    price_raw: str = ""
+
+    @property
+    def price_text(self):
+        if self.price_raw.strip():
+            return " ".join(self.price_raw.split())
+        if self.price is None:
+            return "Не указана"
+        return f"{self.price:,} ₽".replace(",", " ")
+
+    @property
+    def rating_text(self):
+        return NOT_PROVIDED if self.rating is None else f"{self.rating:.1f}".replace(".", ",")
+
+    @property
+    def reviews_text(self):
+        return NOT_PROVIDED if self.reviews is None else str(self.reviews)
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
@@ -0,0 +1,77 @@
+import asyncio
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from bot.bench.suite import BACKENDS, BENCHMARKS, KEY_PARAMS, compare, run_suite
+
+
+# ---------------------------------------------------------------------
+# Бенчмарки на локальных фикстурах
+# ---------------------------------------------------------------------
+class Command(BaseCommand):
+    help = (
+        "Замеряет парсинг, загрузку картинок, генерацию PDF и полный цикл "
+        "обработки запроса на локальной копии выдачи Avito"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--limit", type=int, help="Объявлений на поиск")
+        parser.add_argument("--image-count", type=int, default=50)
+        parser.add_argument("--pdf-sizes", nargs="+", type=int, default=[50, 200, 1000])
+        parser.add_argument(
+            "--latency", type=float, default=0.0, help="Задержка ответа на картинку, с"
+        )
+        parser.add_argument(
+            "--output", help="JSON с результатами, по умолчанию bench-results/<ревизия>.json"
+        )
+        parser.add_argument("--baseline", help="JSON предыдущего прогона для сравнения")
+        parser.add_argument(
+            "--backend",
+            choices=BACKENDS,
+            default="browser",
+            help="Как получать выдачу в extraction и e2e (см. PARSER_BACKEND)",
+        )
+
+    def handle(self, *args, **options):
+        report = asyncio.run(
+            run_suite(
+                options["only"],
+                repeat=options["repeat"],
+                limit=options["limit"],
+                image_count=options["image_count"],
+                pdf_sizes=options["pdf_sizes"],
+                latency=options["latency"],
+                backend=options["backend"],
+            )
+        )
+
+        for result in report["results"]:
+            if "error" in result:
+                self.stdout.write(self.style.ERROR(f"{result['name']}: {result['error']}"))
+                continue
+            params = ", ".join(f"{k}={v}" for k, v in result.items() if k in KEY_PARAMS)
+            line = f"{result['name']} ({params}): медиана {result['median_ms']:.1f} мс"
+            if "per_item_ms" in result:
+                line += f", {result['per_item_ms']:.3f} мс на элемент"
+            self.stdout.write(line)
+
+        output = options["output"]
+        if output is None:
+            name = report["revision"] or report["started_at"].replace(":", "-")
+            output = Path(settings.BASE_DIR) / "bench-results" / f"{name}.json"
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        self.stdout.write(f"Результаты сохранены в {output}")
+
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())
+            self.stdout.write(f"Сравнение с ревизией {baseline.get('revision')}:")
+            for key, old, new, change in compare(report, baseline):
+                style = self.style.ERROR if change > 10 else self.style.SUCCESS
+                self.stdout.write(style(f"  {key}: {old:.1f} -> {new:.1f} мс ({change:+.1f}%)"))
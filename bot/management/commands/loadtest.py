@@ -0,0 +1,91 @@
+import asyncio
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from bot.bench.load import run_load
+from bot.bench.suite import BACKENDS
+
+
+# ---------------------------------------------------------------------
+# Нагрузочный прогон обработчика сообщений
+# ---------------------------------------------------------------------
+class Command(BaseCommand):
+    help = (
+        "Отправляет handle_message запросы от нескольких пользователей "
+        "и замеряет задержку до PDF, долю ошибок, память и число браузеров"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument(
+            "--messages", type=int, help="Всего сообщений, по умолчанию по два на пользователя"
+        )
+        parser.add_argument("--rate", type=float, default=1.0, help="Сообщений в секунду")
+        parser.add_argument(
+            "--distinct",
+            type=int,
+            help="Разных ссылок среди сообщений (повторы попадают в кэш результатов)",
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=300.0, help="Ожидание PDF по одному сообщению, с"
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.0, help="Задержка ответа на картинку, с"
+        )
+        parser.add_argument(
+            "--backend",
+            choices=BACKENDS,
+            default="browser",
+            help="Как получать выдачу (см. PARSER_BACKEND)",
+        )
+        parser.add_argument(
+            "--output", help="JSON с результатами, по умолчанию bench-results/load-<ревизия>.json"
+        )
+
+    def handle(self, *args, **options):
+        report = asyncio.run(
+            run_load(
+                users=options["users"],
+                messages=options["messages"],
+                rate=options["rate"],
+                distinct=options["distinct"],
+                timeout=options["timeout"],
+                latency=options["latency"],
+                backend=options["backend"],
+            )
+        )
+
+        latency = report["latency_ms"]
+        peak = report["peak"]
+        self.stdout.write(
+            f"{report['messages']} сообщений от {report['users']} пользователей "
+            f"(выдача: {report['backend']}) за {report['elapsed_s']:.1f} с: {report['statuses']}"
+        )
+        self.stdout.write(
+            f"До PDF: p50 {latency['p50']:.0f} мс, p95 {latency['p95']:.0f} мс, "
+            f"p99 {latency['p99']:.0f} мс, максимум {report['max_latency_ms']:.0f} мс"
+        )
+        style = self.style.ERROR if report["error_rate"] else self.style.SUCCESS
+        self.stdout.write(
+            style(
+                f"Доля ошибок {report['error_rate']:.1%}, "
+                f"пропускная способность {report['throughput_per_min']:.1f} PDF в минуту"
+            )
+        )
+        self.stdout.write(
+            f"Пик: RSS {peak['rss_bytes'] // 2**20} МБ (с браузерами и пулами), "
+            f"браузеров {peak['browsers']}, контекстов {peak['contexts']}, "
+            f"поисков {peak['running_jobs']}, в очереди {peak['queued_jobs']}"
+        )
+
+        output = options["output"]
+        if output is None:
+            name = report["revision"] or report["started_at"].replace(":", "-")
+            output = Path(settings.BASE_DIR) / "bench-results" / f"load-{name}.json"
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        self.stdout.write(f"Результаты сохранены в {output}")
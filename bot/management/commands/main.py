@@ -1,12 +1,9 @@
-import os
-import django
-from django.core.management import BaseCommand
-from telegram.ext import MessageHandler, filters, ApplicationBuilder, CommandHandler
-from bot.handlers import handle_message, start_command
-from search_bot.settings import API_KEY
+import asyncio
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "search_bot.settings")
-django.setup()
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from bot.application import build_application, on_shutdown, prewarm, profile
 
 
 # ---------------------------------------------------------------------
@@ -15,14 +12,55 @@ django.setup()
 class Command(BaseCommand):
     help = "Запускает Telegram-бота"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile-startup",
+            action="store_true",
+            help="Замерить импорт и инициализацию (включая прогрев) и выйти без polling. "
+            "Подробнее по импортам: python -X importtime manage.py main --profile-startup",
+        )
+        parser.add_argument(
+            "--set-webhook",
+            metavar="URL",
+            help="Зарегистрировать webhook (например https://example.com/telegram/webhook/) "
+            "с секретом WEBHOOK_SECRET и выйти. Пустая строка удаляет webhook",
+        )
+
     def handle(self, *args, **options):
-        # application = ApplicationBuilder().token(API_KEY).concurrent_updates(True).build()
-        application = ApplicationBuilder().token(API_KEY).build()
+        application = build_application()
 
-        application.add_handler(
-            MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message)
-        )
-        application.add_handler(CommandHandler("start", start_command)),
+        if options["profile_startup"]:
+            try:
+                asyncio.run(self.profile_prewarm())
+            finally:
+                self.stdout.write(profile.report())
+            return
+
+        if options["set_webhook"] is not None:
+            asyncio.run(self.set_webhook(application, options["set_webhook"]))
+            return
 
         self.stdout.write("Бот запущен, начинается polling...")
         application.run_polling()
+
+    @staticmethod
+    async def profile_prewarm():
+        try:
+            await prewarm()
+        finally:
+            await on_shutdown(None)
+
+    async def set_webhook(self, application, url):
+        async with application.bot as bot:
+            if not url:
+                await bot.delete_webhook()
+                self.stdout.write("Webhook удалён, можно снова запускать polling")
+                return
+            if not settings.WEBHOOK_SECRET:
+                raise CommandError("Укажите WEBHOOK_SECRET в окружении")
+            await bot.set_webhook(
+                url,
+                secret_token=settings.WEBHOOK_SECRET,
+                max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            )
+            self.stdout.write(f"Webhook установлен: {url}")
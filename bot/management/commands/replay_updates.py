@@ -0,0 +1,107 @@
+import asyncio
+import copy
+import json
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+
+import aiohttp
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+DEFAULT_UPDATES = Path(__file__).resolve().parents[2] / "bench" / "updates.json"
+
+
+def load_updates(path):
+    """
+    Обновления из JSON-массива или из файла JSON Lines (по одному на строку).
+    """
+    text = Path(path).read_text(encoding="utf-8")
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def expand(updates, repeat, users):
+    """
+    Размножает записанные обновления: у каждой копии свой update_id,
+    а чаты распределены по users пользователям.
+    """
+    result = []
+    next_id = max(u["update_id"] for u in updates) + 1
+    for i in range(repeat):
+        for update in updates:
+            update = copy.deepcopy(update)
+            if i:
+                update["update_id"] = next_id
+                next_id += 1
+            message = update.get("message")
+            if message and users > 1:
+                user_id = message["from"]["id"] + i % users
+                message["from"]["id"] = message["chat"]["id"] = user_id
+            result.append(update)
+    return result
+
+
+# ---------------------------------------------------------------------
+# Отправка записанных обновлений на webhook
+# ---------------------------------------------------------------------
+class Command(BaseCommand):
+    help = "Отправляет записанные обновления Telegram на webhook ASGI-приложения"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/telegram/webhook/")
+        parser.add_argument("--file", default=str(DEFAULT_UPDATES))
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument(
+            "--users", type=int, default=1, help="На сколько чатов распределить копии"
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--secret", help="По умолчанию WEBHOOK_SECRET")
+
+    def handle(self, *args, **options):
+        secret = options["secret"] or settings.WEBHOOK_SECRET
+        if not secret:
+            raise CommandError("Укажите --secret или WEBHOOK_SECRET")
+        updates = expand(load_updates(options["file"]), options["repeat"], options["users"])
+        statuses, timings, elapsed = asyncio.run(
+            self.replay(options["url"], secret, updates, options["concurrency"])
+        )
+
+        self.stdout.write(
+            f"Отправлено {len(updates)} обновлений за {elapsed:.2f} с "
+            f"({len(updates) / elapsed:.1f} в секунду)"
+        )
+        self.stdout.write(f"Ответы: {dict(statuses)}")
+        if timings:
+            timings.sort()
+            self.stdout.write(
+                f"Время ответа: медиана {statistics.median(timings) * 1000:.1f} мс, "
+                f"p95 {timings[int(len(timings) * 0.95)] * 1000:.1f} мс, "
+                f"макс {timings[-1] * 1000:.1f} мс"
+            )
+
+    @staticmethod
+    async def replay(url, secret, updates, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        statuses = Counter()
+        timings = []
+        headers = {"X-Telegram-Bot-Api-Secret-Token": secret}
+
+        async def post(session, update):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    async with session.post(url, json=update, headers=headers) as response:
+                        await response.read()
+                        statuses[response.status] += 1
+                except aiohttp.ClientError as e:
+                    statuses[type(e).__name__] += 1
+                    return
+                timings.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*(post(session, update) for update in updates))
+        return statuses, timings, time.perf_counter() - started
@@ -0,0 +1,347 @@
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм длительности, в секундах
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+# ---------------------------------------------------------------------
+# ID задачи в логах
+# ---------------------------------------------------------------------
+
+current_job_id = ContextVar("current_job_id", default="-")
+_current_job = ContextVar("current_job", default=None)
+
+_record_factory = logging.getLogRecordFactory()
+
+
+def _job_record_factory(*args, **kwargs):
+    record = _record_factory(*args, **kwargs)
+    record.job_id = current_job_id.get()
+    return record
+
+
+# Каждая запись лога получает поле job_id, его можно выводить в формате
+logging.setLogRecordFactory(_job_record_factory)
+LOG_FORMAT = "%(asctime)s [%(levelname)s] [%(job_id)s] %(name)s: %(message)s"
+
+
+def peak_rss():
+    """
+    :return: Пиковый RSS процесса и его дочерних процессов (пулов) в байтах.
+        Дочерние процессы учитываются после их завершения.
+    """
+    # На Linux ru_maxrss в килобайтах, на macOS - в байтах
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return own, children
+
+
+# ---------------------------------------------------------------------
+# Счётчики процесса в формате Prometheus
+# ---------------------------------------------------------------------
+
+
+class Registry:
+    """
+    Счётчики, гистограммы и показатели (gauge) одного процесса.
+    Метка - кортеж пар (имя, значение).
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = {
+                "buckets": [0] * len(DURATION_BUCKETS),
+                "sum": 0.0,
+                "count": 0,
+            }
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+    def set(self, name, value, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def snapshot(self):
+        """
+        Состояние реестра в виде, пригодном для JSON.
+        """
+        return {
+            kind: [[name, list(labels), value] for (name, labels), value in values.items()]
+            for kind, values in (
+                ("counters", self.counters),
+                ("histograms", self.histograms),
+                ("gauges", self.gauges),
+            )
+        }
+
+
+registry = Registry()
+
+
+# ---------------------------------------------------------------------
+# Метрики одной задачи поиска
+# ---------------------------------------------------------------------
+
+
+class JobMetrics:
+    """
+    Время, количество элементов и байты по этапам одной задачи.
+    Этапы, выполняющиеся параллельно (вкладки), суммируются.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.stages = {}
+        self.counts = {}
+        self.status = "success"
+        self.started = time.perf_counter()
+
+    def add(self, stage, seconds=0.0, items=0, size=0):
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "items": 0, "bytes": 0})
+        entry["seconds"] += seconds
+        entry["items"] += items
+        entry["bytes"] += size
+
+    def summary(self):
+        parts = [
+            f"{stage}={entry['seconds']:.2f}с"
+            + (f"/{entry['items']}шт" if entry["items"] else "")
+            + (f"/{entry['bytes']}Б" if entry["bytes"] else "")
+            for stage, entry in self.stages.items()
+        ]
+        parts += [f"{name}={value}" for name, value in self.counts.items()]
+        return ", ".join(parts)
+
+
+def new_job_id():
+    return uuid.uuid4().hex[:12]
+
+
+@asynccontextmanager
+async def track_job(job_id=None):
+    """
+    Отмечает задачу поиска: ID задачи попадает в логи, этапы внутри
+    блока (включая задачи asyncio, созданные в нём) учитываются в её метриках.
+    По окончании метрики процесса сохраняются для /metrics.
+
+    Ошибка, обработанная внутри блока, отмечается через job.status = "error".
+    Отменённая задача получает статус "cancelled".
+
+    :param job_id: ID задачи, по умолчанию генерируется.
+    """
+    job = JobMetrics(job_id or new_job_id())
+    job_token = _current_job.set(job)
+    id_token = current_job_id.set(job.job_id)
+    try:
+        yield job
+    except asyncio.CancelledError:
+        job.status = "cancelled"
+        raise
+    except BaseException:
+        job.status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - job.started
+        registry.inc("search_jobs_total", status=job.status)
+        registry.observe("search_job_seconds", duration)
+        own, children = peak_rss()
+        registry.set("search_process_peak_rss_bytes", own)
+        registry.set("search_children_peak_rss_bytes", children)
+        logger.info(
+            f"Задача завершена ({job.status}) за {duration:.2f}с: {job.summary()}; "
+            f"пиковый RSS {own // 2**20} МБ, пулов {children // 2**20} МБ"
+        )
+        _current_job.reset(job_token)
+        current_job_id.reset(id_token)
+        store.save(registry)
+
+
+class Stage:
+    """
+    Результат этапа, который становится известен внутри блока stage().
+    """
+
+    __slots__ = ("items", "bytes")
+
+    def __init__(self, items=0, size=0):
+        self.items = items
+        self.bytes = size
+
+
+@contextmanager
+def stage(name, items=0, size=0):
+    """
+    Замеряет этап задачи. Количество элементов и байты можно указать
+    сразу или заполнить внутри блока: ``with stage("pdf") as s: s.bytes = ...``.
+
+    :param name: Этап: scroll, extract, images, thumbnails, pdf, upload.
+    """
+    result = Stage(items, size)
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        seconds = time.perf_counter() - started
+        registry.observe("search_stage_seconds", seconds, stage=name)
+        if result.items:
+            registry.inc("search_stage_items_total", result.items, stage=name)
+        if result.bytes:
+            registry.inc("search_stage_bytes_total", result.bytes, stage=name)
+        job = _current_job.get()
+        if job is not None:
+            job.add(name, seconds, result.items, result.bytes)
+
+
+def count(name, value=1, **labels):
+    """
+    Увеличивает счётчик процесса и такой же счётчик текущей задачи.
+    """
+    registry.inc(name, value, **labels)
+    job = _current_job.get()
+    if job is not None:
+        key = name + "".join(f"[{v}]" for _, v in sorted(labels.items()))
+        job.counts[key] = job.counts.get(key, 0) + value
+
+
+# ---------------------------------------------------------------------
+# Общие метрики нескольких процессов
+# ---------------------------------------------------------------------
+
+
+class SnapshotStore:
+    """
+    Каждый процесс (бот, воркеры Celery) сохраняет свой реестр в файл
+    <pid>.json, а /metrics складывает файлы всех процессов. Файлы умерших
+    процессов удаляются через retention секунд после последней записи.
+    """
+
+    def __init__(self, directory, retention=86400):
+        self.directory = Path(directory)
+        self.retention = retention
+
+    @property
+    def path(self):
+        return self.directory / f"{os.getpid()}.json"
+
+    def save(self, registry):
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(registry.snapshot(), f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить метрики: {e}")
+
+    def load_all(self, own_registry=None):
+        """
+        :param own_registry: Реестр текущего процесса, заменяет его файл.
+        :return: Список снимков реестров всех процессов.
+        """
+        snapshots = [own_registry.snapshot()] if own_registry is not None else []
+        now = time.time()
+        for path in self.directory.glob("*.json"):
+            if own_registry is not None and path == self.path:
+                continue
+            try:
+                if now - path.stat().st_mtime > self.retention and not _pid_alive(int(path.stem)):
+                    path.unlink()
+                    continue
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+store = SnapshotStore(settings.METRICS_DIR)
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def render_prometheus(snapshots):
+    """
+    Складывает снимки процессов и выводит их в текстовом формате Prometheus.
+    Счётчики и гистограммы суммируются, показатели RSS берутся максимальные.
+    """
+    counters, histograms, gauges = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, h in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(
+                key, {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0}
+            )
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], h["buckets"])]
+            total["sum"] += h["sum"]
+            total["count"] += h["count"]
+        for name, labels, value in snapshot["gauges"]:
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = max(gauges.get(key, 0), value)
+
+    lines = []
+    typed = set()
+
+    def declare(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        declare(name, "counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for (name, labels), h in sorted(histograms.items()):
+        declare(name, "histogram")
+        for bound, count in zip(DURATION_BUCKETS, h["buckets"]):
+            lines.append(f"{name}_bucket{_labels(labels, le=bound)} {count}")
+        lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {h["count"]}')
+        lines.append(f"{name}_sum{_labels(labels)} {h['sum']}")
+        lines.append(f"{name}_count{_labels(labels)} {h['count']}")
+    for (name, labels), value in sorted(gauges.items()):
+        declare(name, "gauge")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
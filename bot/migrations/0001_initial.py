@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:16
+
+import datetime
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telegram_id', models.BigIntegerField(unique=True, verbose_name='ID пользователя')),
+                ('first_interaction', models.DateTimeField(default=datetime.datetime.now, verbose_name='Дата первого взаимодействия')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScrapedListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=1000, verbose_name='Поисковый запрос')),
+                ('position', models.PositiveIntegerField(verbose_name='Позиция в выдаче')),
+                ('listing_id', models.CharField(max_length=255, verbose_name='ID объявления')),
+                ('url', models.URLField(blank=True, max_length=1000, verbose_name='Ссылка')),
+                ('title', models.CharField(max_length=500, verbose_name='Заголовок')),
+                ('price', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Цена')),
+                ('seller', models.CharField(max_length=255, verbose_name='Продавец')),
+                ('rating', models.FloatField(blank=True, null=True, verbose_name='Рейтинг')),
+                ('reviews', models.PositiveIntegerField(blank=True, null=True, verbose_name='Отзывы')),
+                ('text', models.TextField(blank=True, verbose_name='Описание')),
+                ('image_url', models.URLField(blank=True, max_length=1000, null=True, verbose_name='Фото')),
+                ('scraped_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата парсинга')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listing_id'], name='bot_scraped_listing_8e1494_idx'), models.Index(fields=['query', '-scraped_at'], name='bot_scraped_query_141537_idx')],
+            },
+        ),
+    ]
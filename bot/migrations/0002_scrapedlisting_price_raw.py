@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapedlisting',
+            name='price_raw',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Цена на сайте'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from django.db import models
+from django.utils import timezone
 
 
 class TelegramUser(models.Model):
@@ -8,3 +9,27 @@ class TelegramUser(models.Model):
     first_interaction = models.DateTimeField(
         verbose_name="Дата первого взаимодействия", default=datetime.now
     )
+
+
+class ScrapedListing(models.Model):
+    query = models.CharField(max_length=1000, verbose_name="Поисковый запрос")
+    position = models.PositiveIntegerField(verbose_name="Позиция в выдаче")
+    listing_id = models.CharField(max_length=255, verbose_name="ID объявления")
+    url = models.URLField(max_length=1000, blank=True, verbose_name="Ссылка")
+    title = models.CharField(max_length=500, verbose_name="Заголовок")
+    price = models.PositiveBigIntegerField(null=True, blank=True, verbose_name="Цена")
+    price_raw = models.CharField(
+        max_length=100, blank=True, default="", verbose_name="Цена на сайте"
+    )
+    seller = models.CharField(max_length=255, verbose_name="Продавец")
+    rating = models.FloatField(null=True, blank=True, verbose_name="Рейтинг")
+    reviews = models.PositiveIntegerField(null=True, blank=True, verbose_name="Отзывы")
+    text = models.TextField(blank=True, verbose_name="Описание")
+    image_url = models.URLField(max_length=1000, null=True, blank=True, verbose_name="Фото")
+    scraped_at = models.DateTimeField(verbose_name="Дата парсинга", default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["listing_id"]),
+            models.Index(fields=["query", "-scraped_at"]),
+        ]
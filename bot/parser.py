@@ -1,52 +1,159 @@
 import asyncio
-import os
+import math
 import logging
-import ssl
+import re
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
 
-import aiohttp
+from django.conf import settings
 
-from io import BytesIO
+from bot.browser_pool import browser_pool
+from bot.downloader import image_downloader
+from bot.image_cache import image_cache
+from bot.listing import Listing, parse_price, parse_seller_stats
+from bot.metrics import LOG_FORMAT, count, stage
 
-from playwright.async_api import async_playwright
-from reportlab.pdfbase import pdfmetrics
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfbase.ttfonts import TTFont
-
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
-)
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------
-# Настройка логов
+# Селекторы карточки объявления
 # ---------------------------------------------------------------------
-FONT_PATH_REG = os.path.join("fonts/open-sans", "OpenSans-Regular.ttf")
-FONT_PATH_BOLD = os.path.join("fonts/open-sans", "OpenSans-Bold.ttf")
-pdfmetrics.registerFont(TTFont("OpenSans", FONT_PATH_REG))
-pdfmetrics.registerFont(TTFont("OpenSansBold", FONT_PATH_BOLD))
+
+CARD_SELECTOR = "div.iva-item-content-OWwoq"
+
+# Поле -> (CSS-селектор внутри карточки, что брать: "text" или имя атрибута).
+# Таблица общая для обоих режимов извлечения.
+CARD_FIELDS = {
+    "image": ("img", "src"),
+    "title": ("div.iva-item-body-GQomw a", "text"),
+    "url": ("div.iva-item-body-GQomw a", "href"),
+    "price": ("span", "text"),
+    "company_name": ("div.style-root-Dh2i5 p", "text"),
+    "company_block": ("div.style-root-Dh2i5", "text"),
+    "text": ("div.iva-item-bottomBlock-FhNhY p", "text"),
+}
+
+# Числовой id объявления в конце ссылки: /moskva/telefony/iphone_13_3456789012
+LISTING_ID_RE = re.compile(r"_(\d+)$")
+
+# Собирает все поля всех карточек за один вызов page.evaluate.
+# Для атрибутов берётся свойство элемента, чтобы ссылки были абсолютными.
+EXTRACT_CARDS_JS = """
+([cardSelector, fields]) => Array.from(
+    document.querySelectorAll(cardSelector),
+    (card) => {
+        const record = {};
+        for (const [name, [selector, attr]] of Object.entries(fields)) {
+            const el = card.querySelector(selector);
+            if (!el) {
+                record[name] = null;
+            } else if (attr === "text") {
+                record[name] = el.innerText;
+            } else {
+                const value = el.getAttribute(attr);
+                record[name] = value && (el[attr] || value);
+            }
+        }
+        return record;
+    }
+)
+"""
+
+
+# Прокручивает страницу по экрану за шаг. После каждого шага ждёт, пока DOM
+# успокоится (quietMs без мутаций, но не дольше stepMs), вместо фиксированной
+# паузы. Останавливается, когда limit-я карточка попала в область видимости,
+# когда внизу страницы перестали появляться новые карточки (stalled - выдача
+# закончилась) или по дедлайну.
+SCROLL_UNTIL_LOADED_JS = """
+async ([cardSelector, limit, deadlineMs, quietMs, stepMs, maxStalls]) => {
+    const deadline = Date.now() + deadlineMs;
+    const cards = () => document.querySelectorAll(cardSelector);
+    const limitReached = () => {
+        const found = cards();
+        return found.length >= limit
+            && found[limit - 1].getBoundingClientRect().top < window.innerHeight;
+    };
+    const settle = () => new Promise((resolve) => {
+        let quietTimer;
+        const observer = new MutationObserver(() => {
+            clearTimeout(quietTimer);
+            quietTimer = setTimeout(done, quietMs);
+        });
+        const hardStop = setTimeout(
+            done, Math.max(0, Math.min(stepMs, deadline - Date.now()))
+        );
+        function done() {
+            observer.disconnect();
+            clearTimeout(quietTimer);
+            clearTimeout(hardStop);
+            resolve();
+        }
+        observer.observe(document.body, {
+            childList: true, subtree: true, attributes: true, attributeFilter: ["src"],
+        });
+        quietTimer = setTimeout(done, quietMs);
+    });
+
+    let stalls = 0;
+    let stalled = false;
+    while (Date.now() < deadline && !limitReached()) {
+        const before = cards().length;
+        const atBottom =
+            window.innerHeight + window.scrollY >= document.body.scrollHeight - 2;
+        window.scrollBy(0, window.innerHeight);
+        await settle();
+        if (atBottom) {
+            stalls = cards().length > before ? 0 : stalls + 1;
+            if (stalls >= maxStalls) {
+                stalled = true;
+                break;
+            }
+        }
+    }
+    return [cards().length, stalled];
+}
+"""
+
 
 # ---------------------------------------------------------------------
 # Функция для прогрузки данных перед их парсингом с Авито
 # ---------------------------------------------------------------------
 
 
-async def scroll_smoothly(page, steps=20, delay=0.5):
+async def scroll_until_loaded(page, limit, timeout=None):
     """
-    Выполняет плавный скроллинг страницы вниз для подгрузки данных.
+    Прокручивает страницу, пока не загрузится limit карточек или пока их
+    количество не перестанет расти. Вся прокрутка выполняется внутри
+    браузера за один вызов page.evaluate.
 
     :param page: Объект страницы Playwright.
-    :param steps: Количество шагов скроллинга.
-    :param delay: Задержка между шагами (в секундах).
-    """
-    logger.debug(f"Начинаю плавный скролл: шагов={steps}, задержка={delay}")
-    total_height = await page.evaluate("document.body.scrollHeight")
-    step_size = total_height / steps
-    for i in range(steps):
-        await page.evaluate(f"window.scrollBy(0, {step_size})")
-        await page.wait_for_selector("div.iva-item-content-OWwoq")
-        await asyncio.sleep(delay)
-
-    logger.debug("Скролл завершён")
+    :param limit: Сколько карточек нужно загрузить.
+    :param timeout: Общий дедлайн прокрутки в секундах,
+        по умолчанию settings.SCROLL_TIMEOUT.
+    :return: Количество карточек на странице и признак того, что внизу
+        страницы перестали появляться новые карточки (выдача закончилась).
+    """
+    timeout = timeout or settings.SCROLL_TIMEOUT
+    logger.debug(f"Начинаю прокрутку: нужно карточек={limit}, дедлайн={timeout}с")
+    with stage("scroll") as s:
+        await page.wait_for_selector(CARD_SELECTOR, timeout=timeout * 1000)
+        loaded, stalled = await page.evaluate(
+            SCROLL_UNTIL_LOADED_JS,
+            [
+                CARD_SELECTOR,
+                max(limit, 1),
+                timeout * 1000,
+                settings.SCROLL_QUIET_MS,
+                settings.SCROLL_STEP_MS,
+                settings.SCROLL_MAX_STALLS,
+            ],
+        )
+        s.items = loaded
+    logger.debug(
+        f"Прокрутка завершена, карточек на странице: {loaded}, конец выдачи: {stalled}"
+    )
+    return loaded, stalled
 
 
 # ---------------------------------------------------------------------
@@ -56,30 +163,22 @@ async def scroll_smoothly(page, steps=20, delay=0.5):
 
 async def download_image(url):
     """
-    Загружает изображение по URL и возвращает объект ImageReader.
+    Загружает изображение по URL, сначала проверяя дисковый кэш.
 
     :param url: Ссылка на изображение.
-    :return: Объект ImageReader или None, если загрузка не удалась.
+    :return: Байты изображения или None, если загрузка не удалась.
     """
-    if url == "Нет фото":
+    if not url:
         return None
 
-    try:
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=5, ssl=ssl_context) as response:
-                if response.status == 200:
-                    data = await response.read()  # Считываем данные в бинарном виде
-                    return ImageReader(BytesIO(data))
-                else:
-                    logger.warning(f"Ошибка загрузки {url}: статус {response.status}")
-                    return None
-    except Exception as e:
-        logger.warning(f"Ошибка загрузки {url}: {e}")
-        return None
+    data = await image_cache.get(url)
+    if data is not None:
+        return data
+
+    data = await image_downloader.fetch(url)
+    if data is not None:
+        await image_cache.put(url, data)
+    return data
 
 
 # ---------------------------------------------------------------------
@@ -89,130 +188,370 @@ async def download_image(url):
 
 async def download_all_images(urls):
     """
-    Загружает все изображения из списка URL асинхронно.
+    Загружает все изображения из списка URL асинхронно. Число одновременных
+    загрузок ограничивает общий ImageDownloader.
 
-    :param urls: Список строковых URL.
-    :return: Список объектов ImageReader.
+    :param urls: Список строковых URL (None - у объявления нет фото).
+    :return: Список байтов изображений (None для незагруженных).
     """
-    tasks = [download_image(url) for url in urls]
-    images = await asyncio.gather(*tasks)
+    with stage("images") as s:
+        tasks = [download_image(url) for url in urls]
+        images = await asyncio.gather(*tasks)
+        s.items = sum(1 for data in images if data)
+        s.bytes = sum(len(data) for data in images if data)
     return images
 
 
+# ---------------------------------------------------------------------
+# Функции извлечения данных из карточек
+# ---------------------------------------------------------------------
+
+
+async def extract_cards_bulk(page, fields=None):
+    """
+    Извлекает поля всех карточек на странице за один round trip к браузеру.
+
+    :param page: Объект страницы Playwright.
+    :param fields: Таблица селекторов, по умолчанию CARD_FIELDS.
+    :return: Список словарей с сырыми значениями полей.
+    """
+    fields = fields or CARD_FIELDS
+    return await page.evaluate(EXTRACT_CARDS_JS, [CARD_SELECTOR, fields])
+
+
+async def extract_cards_legacy(page, fields=None):
+    """
+    Извлекает те же поля поэлементно, отдельным запросом на каждое поле.
+    Медленнее, оставлен для отладки селекторов.
+
+    :param page: Объект страницы Playwright.
+    :param fields: Таблица селекторов, по умолчанию CARD_FIELDS.
+    :return: Список словарей с сырыми значениями полей.
+    """
+    fields = fields or CARD_FIELDS
+    records = []
+    for item in await page.query_selector_all(CARD_SELECTOR):
+        record = {}
+        for name, (selector, attr) in fields.items():
+            el = await item.query_selector(selector)
+            if el is None:
+                record[name] = None
+            elif attr == "text":
+                record[name] = await el.inner_text()
+            else:
+                # Как el.href и el.src в EXTRACT_CARDS_JS - абсолютная ссылка
+                value = await el.get_attribute(attr)
+                record[name] = urljoin(page.url, value) if value else value
+        records.append(record)
+    return records
+
+
+EXTRACTORS = {
+    "bulk": extract_cards_bulk,
+    "legacy": extract_cards_legacy,
+}
+
+
+def build_listing(raw):
+    """
+    Приводит сырые поля карточки к записи Listing.
+
+    :param raw: Словарь, полученный из extract_cards_*.
+    :return: Объект Listing.
+    """
+    company_name = raw.get("company_name")
+    combined_info = raw.get("company_block")
+    rating = reviews = None
+    if combined_info and company_name:
+        # Блок продавца: "<название>\n<рейтинг>\n<отзывы>"
+        combined_info_sliced = combined_info[len(company_name):].replace("\n", " ")
+        rating, reviews = parse_seller_stats(combined_info_sliced)
+
+    return Listing(
+        id=listing_key(raw),
+        url=raw.get("url") or "",
+        title=(raw.get("title") or "").strip(),
+        price=parse_price(raw.get("price")),
+        price_raw=(raw.get("price") or "").strip(),
+        seller=(company_name or "Не предоставили").strip(),
+        rating=rating,
+        reviews=reviews,
+        text=(raw.get("text") or "").strip(),
+        image_url=raw.get("image") or None,
+    )
+
+
 # ---------------------------------------------------------------------
 # Функция парсинга с Авито
 # ---------------------------------------------------------------------
 
 
-async def parse_avito(query: str, limit=50, max_attempts=3):
+def page_url(search_url, number):
     """
-    Ищет товары на Avito, парсит страницу, извлекает изображения и описание.
+    Ссылка на страницу выдачи с номером number (параметр p).
+    """
+    if number == 1:
+        return search_url
+    parts = urlsplit(search_url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "p"]
+    query.append(("p", str(number)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def listing_key(raw):
+    """
+    Стабильный ключ объявления для удаления дублей между страницами:
+    числовой id из конца ссылки, ссылка или заголовок с ценой.
+    """
+    url = raw.get("url")
+    if url:
+        match = LISTING_ID_RE.search(urlsplit(url).path)
+        return match.group(1) if match else url
+    return f"{raw.get('title')}|{raw.get('price')}"
+
+
+async def stream_page(page, url, limit, extract_cards, budget=None):
+    """
+    Открывает одну страницу выдачи во вкладке и отдаёт сырые карточки по мере
+    извлечения. Карточки первого экрана, у которых уже загружена картинка,
+    отдаются сразу после открытия страницы, остальные - после прокрутки.
+
+    Если карточек меньше limit и прокрутка упёрлась в дедлайн (или карточек
+    извлечено меньше, чем загружено), страница перезагружается
+    с экспоненциальной паузой, пока не истечёт budget. Если новые карточки
+    перестали появляться внизу страницы, выдача считается законченной.
+    Уже отданные карточки (по listing_key) при повторных попытках
+    пропускаются, собранное до перезагрузки сохраняется.
+
+    :param page: Вкладка Playwright.
+    :param url: Ссылка на страницу выдачи.
+    :param limit: Сколько карточек нужно с этой страницы.
+    :param extract_cards: Функция извлечения карточек.
+    :param budget: Время на страницу в секундах, включая повторные попытки,
+        по умолчанию settings.RETRY_BUDGET.
+    :return: Асинхронный генератор словарей с сырыми полями карточек.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (budget or settings.RETRY_BUDGET)
+    await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+    logger.debug(f"Перешли на страницу: {url}")
+    await page.wait_for_selector(CARD_SELECTOR, timeout=settings.SCROLL_TIMEOUT * 1000)
+
+    # Первый экран: отдаём карточки до первой без загруженной картинки,
+    # чтобы не потерять картинки, которые подгрузятся при прокрутке
+    seen = set()
+    with stage("extract") as s:
+        records = await extract_cards(page)
+        s.items = len(records)
+    for raw in records[:limit]:
+        if not raw.get("image"):
+            break
+        seen.add(listing_key(raw))
+        yield raw
+    logger.info(f"Сразу после загрузки {url} извлечено {len(seen)} объявлений")
+
+    attempt = 0
+    delay = settings.RETRY_BACKOFF
+    while len(seen) < limit:
+        attempt += 1
+        remaining = deadline - loop.time()
+        loaded, stalled = await scroll_until_loaded(
+            page, limit, timeout=max(1.0, min(settings.SCROLL_TIMEOUT, remaining))
+        )
+        with stage("extract") as s:
+            records = await extract_cards(page)
+            new = [raw for raw in records if listing_key(raw) not in seen]
+            s.items = len(new)
+        logger.info(
+            f"Попытка {attempt}: на странице {url} {loaded} карточек, новых {len(new)}"
+        )
+        for raw in new[: limit - len(seen)]:
+            seen.add(listing_key(raw))
+            yield raw
+
+        if len(seen) >= limit or loaded >= limit:
+            break
+        if stalled and len(records) >= loaded:
+            logger.info(f"Выдача на странице {url} закончилась: {loaded} карточек")
+            break
+        if deadline - loop.time() <= delay:
+            logger.warning(
+                f"Время на страницу {url} истекло: собрано {len(seen)} из {limit} карточек"
+            )
+            break
+        logger.warning(
+            f"Собрано {len(seen)} из {limit} карточек, перезагрузка через {delay:.1f}с..."
+        )
+        count("search_page_retries_total")
+        await asyncio.sleep(delay)
+        delay *= 2
+        await page.reload(wait_until="domcontentloaded")
+
+
+async def _crawl_page(context, semaphore, queue, url, limit, budget, extract_cards):
+    """
+    Обрабатывает одну страницу выдачи в отдельной вкладке и складывает
+    карточки в очередь. По окончании кладёт в очередь None.
+    """
+    try:
+        async with semaphore:
+            page = await context.new_page()
+            try:
+                async for raw in stream_page(page, url, limit, extract_cards, budget):
+                    await queue.put(raw)
+            finally:
+                await page.close()
+    except Exception as e:
+        logger.warning(f"Не удалось обработать страницу {url}: {e!r}")
+        await queue.put(e)
+    finally:
+        await queue.put(None)
+
+
+async def stream_avito(query: str, limit=50, budget=None, extraction=None, backend=None):
+    """
+    Ищет товары на Avito и отдаёт объявления по мере извлечения.
+
+    Если limit больше одной страницы выдачи, страницы p=2..N открываются
+    параллельно во вкладках одного контекста браузера (не больше
+    settings.CRAWL_MAX_PAGES страниц и settings.CRAWL_TABS вкладок сразу).
+    Повторы объявлений между страницами отбрасываются.
 
     :param query: Строка поиска.
     :param limit: Максимальное количество объявлений для обработки.
-    :param max_attempts: Количество попыток подгрузки данных при нехватке информации.
-    :return: Список объектов ImageReader, список текстов и список заголовков объявлений.
+    :param budget: Время на одну страницу выдачи с повторными попытками (с),
+        по умолчанию settings.RETRY_BUDGET.
+    :param extraction: Режим извлечения "bulk" или "legacy",
+        по умолчанию settings.PARSER_EXTRACTION.
+    :param backend: "http" - только загрузка HTML без браузера, "browser" -
+        только Playwright, "auto" - сначала без браузера, а если объявлений
+        меньше settings.HTTP_MIN_RATIO от ожидаемого, через браузер.
+        По умолчанию settings.PARSER_BACKEND.
+    :return: Асинхронный генератор объектов Listing.
     """
     logger.info(f"Парсим Avito для запроса: '{query}'")
+    extract_cards = EXTRACTORS[extraction or settings.PARSER_EXTRACTION]
+    backend = backend or settings.PARSER_BACKEND
     search_url = f"{query.replace(' ', '+')}"
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        logger.debug("Браузер Chromium запущен (headless=False)")
-        page = await browser.new_page()
-        await page.goto(search_url, timeout=60000, wait_until="domcontentloaded")
-        logger.debug(f"Перешли на страницу: {search_url}")
-
-        attempt = 0
-        pics_results = []
-        text_results = []
-        title_results = []
-        company_info_results = []
-
-        while attempt < max_attempts:
-            attempt += 1
-            logger.info(f"Попытка {attempt} загрузки данных...")
-            await scroll_smoothly(page, steps=14, delay=1.0)
-            items = await page.query_selector_all("div.iva-item-content-OWwoq")
-            logger.info(f"Найдено {len(items)} элементов на странице")
-
-            for i, item in enumerate(items[:limit]):
-                img_tag = await item.query_selector("img")
-                if img_tag:
-                    temp_url = await img_tag.get_attribute("src")
-                    if temp_url:
-                        img_url = temp_url
-
-                title_block = await item.query_selector("div.iva-item-body-GQomw")
-                title_tag = await title_block.query_selector("a")
-                title_text = await title_tag.inner_text()
-                title_results.append(title_text)
-
-                price_tag = await item.query_selector("span")
-                price_result = await price_tag.inner_text()
-
-                company_name_tag = await item.query_selector("div.style-root-Dh2i5")
-                if company_name_tag:
-                    company_nam = await company_name_tag.query_selector("p")
-                    company_name = await company_nam.inner_text()
-                else:
-                    company_name = "Не предоставили"
-
-                company_info_tag = await item.query_selector("div.style-root-Dh2i5")
-                if company_info_tag and company_name != "Не предоставили":
-                    combined_info = await company_info_tag.inner_text()
-                    combined_info_sliced = combined_info[len(company_name):].replace(
-                        "\n", ""
-                    )
-                    company_rating = combined_info_sliced[:3]
-                    company_review = combined_info_sliced[3:]
-                elif company_info_tag and company_name == "Не предоставили":
-                    combined_info = await company_info_tag.inner_text()
-                    co = combined_info.replace("\n", "")
-                    company_review = f"Нет компании \n{co}"
-                else:
-                    company_rating = "Не предоставлено"
-                    company_review = "Не предоставлено"
-
-                temp_container = [
-                    price_result,
-                    company_name,
-                    company_rating,
-                    company_review,
-                ]
-                company_info_results.append(temp_container)
-
-                text_div_list = await item.query_selector_all(
-                    "div.iva-item-bottomBlock-FhNhY"
-                )
-                if text_div_list:
-                    text_div = text_div_list[0]
-                    text_tag = await text_div.query_selector("p")
-                    if text_tag:
-                        raw_text_temp = await text_tag.inner_text()
-                        if raw_text_temp:
-                            raw_text = raw_text_temp.strip()
-
-                logger.debug(
-                    f"[{i}] Картинка: {img_url}, Заголовок: {title_text},"
-                    f" Текст: {raw_text[:50]}..."
-                )
-                logger.debug(
-                    f"[{i}]Цена: {temp_container[0]}, Компания: {temp_container[1]},"
-                    f" Рейтинг: {temp_container[2]} и {temp_container[3]}"
+    page_size = settings.AVITO_PAGE_SIZE
+    pages = max(1, min(math.ceil(limit / page_size), settings.CRAWL_MAX_PAGES))
+    per_page = min(limit, page_size)
+
+    if backend != "browser":
+        listings = await _fetch_without_browser(search_url, limit, pages, strict=backend == "http")
+        if listings is not None:
+            count("search_backend_total", backend="http")
+            for i, listing in enumerate(listings):
+                yield _log_listing(i, listing)
+            return
+    count("search_backend_total", backend="browser")
+
+    async with browser_pool.context() as context:
+        queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(settings.CRAWL_TABS)
+        tasks = [
+            asyncio.create_task(
+                _crawl_page(
+                    context,
+                    semaphore,
+                    queue,
+                    page_url(search_url, number),
+                    per_page,
+                    budget,
+                    extract_cards,
                 )
+            )
+            for number in range(1, pages + 1)
+        ]
+        try:
+            seen = set()
+            errors = []
+            finished = 0
+            while finished < pages and len(seen) < limit:
+                raw = await queue.get()
+                if raw is None:
+                    finished += 1
+                    continue
+                if isinstance(raw, Exception):
+                    errors.append(raw)
+                    continue
+                key = listing_key(raw)
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield _log_listing(len(seen) - 1, build_listing(raw))
+
+            if not seen and errors:
+                raise errors[0]
+            logger.info(f"Собрано {len(seen)} объявлений с {pages} страниц")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _fetch_without_browser(search_url, limit, pages, strict):
+    """
+    Быстрый путь без браузера.
 
-                pics_results.append(img_url)
-                text_results.append(raw_text)
+    :param strict: Вернуть результат как есть, даже если он неполный.
+    :return: Список объявлений или None, если нужен браузер.
+    """
+    from bot.http_parser import FastPathError, fetch_listings
 
-            if len(pics_results) < len(items) or len(text_results) < len(items):
-                logger.warning("Недостаточно данных, пробуем ещё раз...")
-                await page.reload()
-                continue
-            else:
-                break
+    expected = min(limit, pages * settings.AVITO_PAGE_SIZE)
+    try:
+        listings = await fetch_listings(search_url, limit, pages)
+    except FastPathError as e:
+        if strict:
+            raise
+        logger.info(f"Страница без браузера не загружена ({e}), используем браузер")
+        count("search_http_fallback_total", reason="fetch")
+        return None
+
+    if strict or len(listings) >= expected * settings.HTTP_MIN_RATIO:
+        logger.info(f"Без браузера извлечено {len(listings)} объявлений")
+        return listings
+    logger.info(
+        f"Без браузера извлечено {len(listings)} из {expected} объявлений, используем браузер"
+    )
+    count("search_http_fallback_total", reason="too_few")
+    return None
+
+
+def _log_listing(i, listing):
+    logger.debug(
+        f"[{i}] Картинка: {listing.image_url}, Заголовок: {listing.title},"
+        f" Текст: {listing.text[:50]}..."
+    )
+    logger.debug(
+        f"[{i}]Цена: {listing.price_text}, Компания: {listing.seller},"
+        f" Рейтинг: {listing.rating} и {listing.reviews}"
+    )
+    return listing
+
+
+async def parse_avito(query: str, limit=50, budget=None, extraction=None, backend=None):
+    """
+    Ищет товары на Avito, парсит страницу, извлекает изображения и описание.
+    Собирает все объявления из stream_avito.
 
-        image_readers = await download_all_images(pics_results)
-        await browser.close()
-        logger.debug("Браузер Chromium закрыт")
-    return image_readers, text_results, title_results, company_info_results
+    :param query: Строка поиска.
+    :param limit: Максимальное количество объявлений для обработки.
+    :param budget: Время на одну страницу выдачи с повторными попытками (с),
+        по умолчанию settings.RETRY_BUDGET.
+    :param extraction: Режим извлечения "bulk" или "legacy".
+    :param backend: "auto", "http" или "browser" (см. stream_avito).
+    :return: Список объектов Listing.
+    """
+    return [
+        listing
+        async for listing in stream_avito(
+            query,
+            limit=limit,
+            budget=budget,
+            extraction=extraction,
+            backend=backend,
+        )
+    ]
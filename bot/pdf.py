@@ -0,0 +1,255 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph
+
+from bot.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Регистрация шрифтов
+# ---------------------------------------------------------------------
+FONT_DIR = settings.BASE_DIR / "fonts" / "open-sans"
+FONTS = {
+    "OpenSans": "OpenSans-Regular.ttf",
+    "OpenSansBold": "OpenSans-Bold.ttf",
+}
+
+
+def register_fonts():
+    """
+    Регистрирует шрифты один раз на процесс. Повторный вызов ничего не делает.
+    Если шрифты зарегистрированы до запуска пула, дочерние процессы
+    получают их уже готовыми.
+    """
+    registered = pdfmetrics.getRegisteredFontNames()
+    for name, filename in FONTS.items():
+        if name not in registered:
+            pdfmetrics.registerFont(TTFont(name, str(FONT_DIR / filename)))
+
+
+# ---------------------------------------------------------------------
+# Сетка картинок на первой странице PDF
+# ---------------------------------------------------------------------
+PAGE_WIDTH, PAGE_HEIGHT = A4
+GRID_COLS = 5
+GRID_PADDING_X = 2
+GRID_PADDING_Y = 2
+IMG_HEIGHT = 77
+IMG_WIDTH = ((PAGE_WIDTH - 77) - (GRID_COLS - 1) * GRID_PADDING_X) / GRID_COLS
+# Рядов на странице; при большом числе объявлений сетка продолжается на следующих
+GRID_ROWS = 10
+
+
+# ---------------------------------------------------------------------
+# Стили и вёрстка блока объявления
+# ---------------------------------------------------------------------
+TEXT_X = 40
+TEXT_TOP = PAGE_HEIGHT - 50
+TEXT_WIDTH = PAGE_WIDTH - 80
+MIN_TEXT_SPACE = 50
+HEADER_HEIGHT = 10
+LINE_GAP = 10
+BLOCK_GAP = 30
+
+
+def _make_text_style():
+    style = getSampleStyleSheet()["Normal"].clone("ListingText")
+    style.wordWrap = "CJK"
+    style.fontName = "OpenSans"
+    style.fontSize = 12
+    style.textColor = colors.black
+    return style
+
+
+# Стиль создаётся один раз на процесс, а не на каждый абзац
+TEXT_STYLE = _make_text_style()
+
+
+def wrap_text(text, max_width=TEXT_WIDTH):
+    """
+    Создаёт абзац и один раз рассчитывает его размеры. Результат используется
+    и для разбивки на страницы, и для отрисовки.
+
+    :param text: Текст (разметка экранируется).
+    :param max_width: Максимальная ширина строки.
+    :return: Абзац и его высота.
+    """
+    p = Paragraph(escape(text), TEXT_STYLE)
+    _, h = p.wrap(max_width, PAGE_HEIGHT)
+    return p, h
+
+
+def layout_listing(idx, listing):
+    """
+    Готовит блок объявления: заголовок и измеренные абзацы.
+
+    :return: Заголовок, список (абзац, высота) и полная высота блока.
+    """
+    header = f"Объявление {idx + 1}: {listing.title}"
+    lines = [
+        f"Цена: {listing.price_text}",
+        f"Компания/ИП: {listing.seller}",
+        f"Рейтинг: {listing.rating_text}",
+        f"Кол-во отзывов: {listing.reviews_text}",
+        listing.text[:100],
+        listing.text[:200],
+    ]
+    paragraphs = [wrap_text(line) for line in lines]
+    height = HEADER_HEIGHT + sum(h + LINE_GAP for _, h in paragraphs)
+    height += BLOCK_GAP - LINE_GAP
+    return header, paragraphs, height
+
+
+# ---------------------------------------------------------------------
+# Функция для создания файла в формате пдф
+# ---------------------------------------------------------------------
+def render_pdf(pics_array, listings):
+    """
+    Создаёт PDF с изображениями и описаниями объявлений. Функция синхронная
+    и выполняется в дочернем процессе, поэтому принимает и возвращает байты.
+
+    Каждый абзац измеряется один раз, страницы верстаются за один проход.
+
+    :param pics_array: Список байтов картинок (None - нет картинки).
+    :param listings: Список объектов Listing.
+    :return: Содержимое PDF.
+    """
+    register_fonts()
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+
+    c.setFont("OpenSans", 14)
+    c.drawString(40, PAGE_HEIGHT - 30, "Изображения по запросу: ")
+
+    y_start = PAGE_HEIGHT - IMG_HEIGHT - 40
+    x_start = 100
+    per_page = GRID_COLS * GRID_ROWS
+
+    for i, data in enumerate(pics_array):
+        if i and i % per_page == 0:
+            c.showPage()
+        col = i % GRID_COLS
+        row = i % per_page // GRID_COLS
+
+        x = x_start + col * (IMG_WIDTH - 23)
+        y = y_start - (row * (IMG_HEIGHT + GRID_PADDING_Y))
+
+        if data:
+            c.drawImage(
+                ImageReader(BytesIO(data)),
+                x,
+                y,
+                IMG_WIDTH,
+                IMG_HEIGHT,
+                preserveAspectRatio=True,
+                anchor="c",
+            )
+
+    c.showPage()
+
+    text_y = TEXT_TOP
+    first_block = True
+
+    for idx, listing in enumerate(listings):
+        header, paragraphs, block_height = layout_listing(idx, listing)
+
+        if not first_block and text_y - block_height < MIN_TEXT_SPACE:
+            c.showPage()
+            text_y = TEXT_TOP
+        first_block = False
+
+        c.setFont("OpenSansBold", 11)
+        c.drawString(TEXT_X, text_y, header)
+        text_y -= HEADER_HEIGHT
+
+        for p, h in paragraphs:
+            p.drawOn(c, TEXT_X, text_y - h)
+            text_y -= h + LINE_GAP
+        text_y -= BLOCK_GAP - LINE_GAP
+
+    c.save()
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------------------------
+# Генерация PDF в пуле процессов
+# ---------------------------------------------------------------------
+_executor = None
+_semaphore = None
+# False в процессах, которым нельзя запускать дочерние (см. use_threads)
+_use_processes = True
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        pool = ProcessPoolExecutor if _use_processes else ThreadPoolExecutor
+        _executor = pool(max_workers=settings.PDF_WORKERS)
+    return _executor
+
+
+def use_threads():
+    """
+    Рендерит PDF в пуле потоков вместо процессов. Процессы воркера
+    Celery prefork демонические и не могут запускать дочерние процессы.
+    """
+    global _use_processes
+    _use_processes = False
+    shutdown_executor()
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def generate_pdf_file(pics_array, listings, timeout=None):
+    """
+    Генерирует PDF в пуле процессов (в воркере Celery prefork - потоков),
+    не блокируя event loop. Одновременно рендерится не больше
+    settings.PDF_WORKERS файлов, остальные ждут.
+
+    :param pics_array: Список байтов картинок (None - нет картинки).
+    :param listings: Список объектов Listing.
+    :param timeout: Таймаут рендеринга в секундах, по умолчанию settings.PDF_TIMEOUT.
+    :return: Содержимое PDF.
+    :raises asyncio.TimeoutError: Если PDF не успел сгенерироваться.
+    """
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.PDF_WORKERS)
+
+    loop = asyncio.get_running_loop()
+    logger.info(f"Начинаем генерацию PDF: {len(listings)} объявлений")
+    await _semaphore.acquire()
+    try:
+        future = loop.run_in_executor(get_executor(), render_pdf, pics_array, listings)
+    except BaseException:
+        _semaphore.release()
+        raise
+    # Рендеринг в пуле не прерывается по таймауту или отмене, поэтому место
+    # освобождается, когда он действительно закончится. Иначе следующие
+    # задачи ждали бы в очереди пула и тратили на это свой PDF_TIMEOUT
+    future.add_done_callback(lambda _: _semaphore.release())
+    with stage("pdf", items=len(listings)) as s:
+        pdf = await asyncio.wait_for(
+            asyncio.shield(future), timeout=timeout or settings.PDF_TIMEOUT
+        )
+        s.bytes = len(pdf)
+    logger.info(f"PDF успешно сгенерирован: {len(pdf)} байт")
+    return pdf
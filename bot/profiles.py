@@ -0,0 +1,169 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from bot.image_cache import ImageCache
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------
+# Профиль браузера: сохранённое состояние (cookies, localStorage)
+# ---------------------------------------------------------------------
+
+
+class Profile:
+    """
+    Каталог профиля, занятый одним браузером пула. Пока каталог занят,
+    на файле .lock держится flock, поэтому другие процессы (второй бот,
+    воркеры Celery) выбирают себе другие каталоги.
+
+    Состояние хранится в state.json в формате storage_state Playwright.
+    Профиль сбрасывается, когда ему больше max_age секунд или файл
+    состояния вырос больше max_bytes.
+    """
+
+    def __init__(self, directory, lock, max_age, max_bytes):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = lock
+
+    @property
+    def state_path(self):
+        return self.directory / "state.json"
+
+    @property
+    def _created_path(self):
+        return self.directory / "created"
+
+    def rotate(self, reason):
+        """
+        Удаляет сохранённое состояние, следующий поиск начнётся с чистого профиля.
+        """
+        for path in (self.state_path, self._created_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        logger.info(f"Профиль {self.directory.name} сброшен: {reason}")
+
+    def state(self):
+        """
+        :return: Путь к состоянию для browser.new_context(storage_state=...)
+            или None, если сохранённого состояния нет или оно устарело.
+        """
+        try:
+            size = self.state_path.stat().st_size
+            created = self._created_path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if time.time() - created > self.max_age:
+            self.rotate("истёк срок")
+            return None
+        if size > self.max_bytes:
+            self.rotate(f"размер {size} байт")
+            return None
+        return str(self.state_path)
+
+    def _write(self, state):
+        data = json.dumps(state, ensure_ascii=False).encode()
+        if len(data) > self.max_bytes:
+            self.rotate(f"размер {len(data)} байт")
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        if not self._created_path.exists():
+            self._created_path.touch()
+
+    async def save(self, context):
+        """
+        Сохраняет cookies и localStorage контекста. Несколько контекстов
+        одного браузера могут сохранять состояние по очереди - остаётся
+        последнее.
+        """
+        try:
+            state = await context.storage_state()
+            await asyncio.to_thread(self._write, state)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить профиль {self.directory.name}: {e}")
+
+    def release(self):
+        self._lock.close()
+
+
+class ProfileStore:
+    """
+    Каталоги профилей <directory>/<N>. Каждый браузер пула занимает
+    первый свободный каталог на всё время работы пула.
+
+    :param directory: Корневой каталог профилей.
+    :param max_age: Через сколько секунд профиль сбрасывается.
+    :param max_bytes: Максимальный размер файла состояния.
+    :param enabled: Если False, acquire() возвращает None.
+    """
+
+    def __init__(self, directory, max_age, max_bytes, enabled=True):
+        self.directory = Path(directory)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+    def acquire(self):
+        """
+        :return: Занятый Profile или None, если профили выключены.
+        """
+        if not self.enabled:
+            return None
+        index = 0
+        while True:
+            directory = self.directory / str(index)
+            directory.mkdir(parents=True, exist_ok=True)
+            lock = open(directory / ".lock", "w")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                index += 1
+                continue
+            return Profile(directory, lock, self.max_age, self.max_bytes)
+
+
+profile_store = ProfileStore(
+    settings.BROWSER_PROFILE_DIR,
+    max_age=settings.BROWSER_PROFILE_MAX_AGE,
+    max_bytes=settings.BROWSER_PROFILE_MAX_BYTES,
+    enabled=settings.BROWSER_PROFILES_ENABLED,
+)
+
+
+# ---------------------------------------------------------------------
+# Дисковый кэш статики страницы выдачи (JS, CSS)
+# ---------------------------------------------------------------------
+# Контексты браузера не пишут HTTP-кэш на диск, поэтому скрипты и стили
+# с доменов ASSET_CACHE_DOMAINS отдаются из своего кэша через context.route
+# (см. RequestFilter). Имена файлов бандлов Avito содержат хэш, поэтому
+# по URL они не меняются.
+
+asset_cache = ImageCache(
+    settings.ASSET_CACHE_DIR,
+    max_bytes=settings.ASSET_CACHE_MAX_BYTES,
+    enabled=settings.ASSET_CACHE_ENABLED,
+    label="статики",
+)
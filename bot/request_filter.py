@@ -0,0 +1,163 @@
+import logging
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from bot.metrics import count
+from bot.profiles import asset_cache
+
+logger = logging.getLogger(__name__)
+
+# Типы ресурсов, которые берутся из кэша статики, и их Content-Type
+ASSET_CONTENT_TYPES = {
+    "script": "application/javascript; charset=utf-8",
+    "stylesheet": "text/css; charset=utf-8",
+}
+
+
+# ---------------------------------------------------------------------
+# Блокировка лишних запросов страницы выдачи
+# ---------------------------------------------------------------------
+
+
+class RequestFilter:
+    """
+    Прерывает запросы страницы, которые не нужны для извлечения карточек:
+    по типу ресурса (картинки, шрифты, видео) и по домену (реклама,
+    счётчики). Ссылки на картинки парсер берёт из атрибута src, поэтому
+    сами картинки загружать не нужно.
+
+    Скрипты и стили с доменов asset_domains отдаются из дискового кэша,
+    при промахе загружаются и сохраняются в него.
+
+    Один экземпляр обслуживает один контекст браузера и считает
+    заблокированные запросы и байты разрешённых ответов.
+
+    :param resource_types: Типы ресурсов Playwright, которые блокируются.
+    :param domains: Домены, запросы к которым (и к их поддоменам) блокируются.
+    :param asset_cache: Кэш статики (ImageCache) или None.
+    :param asset_domains: Домены статики, которую можно кэшировать.
+    """
+
+    def __init__(self, resource_types=(), domains=(), asset_cache=None, asset_domains=()):
+        self.resource_types = frozenset(resource_types)
+        self.domains = tuple(domain.lower().lstrip(".") for domain in domains)
+        self.asset_cache = asset_cache
+        self.asset_domains = tuple(domain.lower().lstrip(".") for domain in asset_domains)
+        self.blocked = Counter()
+        self.assets = Counter()
+        self.allowed = 0
+        self.loaded_bytes = 0
+
+    @staticmethod
+    def _host_matches(url, domains):
+        host = (urlsplit(url).hostname or "").lower()
+        return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+    def block_reason(self, url, resource_type):
+        """
+        :return: Причина блокировки ("type:<тип>" или "domain")
+            или None, если запрос нужно пропустить.
+        """
+        if resource_type in self.resource_types:
+            return f"type:{resource_type}"
+        if self._host_matches(url, self.domains):
+            return "domain"
+        return None
+
+    def cacheable(self, request):
+        return (
+            self.asset_cache is not None
+            and self.asset_cache.enabled
+            and request.method == "GET"
+            and request.resource_type in ASSET_CONTENT_TYPES
+            and self._host_matches(request.url, self.asset_domains)
+        )
+
+    async def attach(self, context):
+        """
+        Подключает фильтр ко всем страницам контекста.
+        """
+        await context.route("**/*", self._handle)
+        context.on("response", self._on_response)
+
+    async def _handle(self, route):
+        request = route.request
+        reason = self.block_reason(request.url, request.resource_type)
+        if reason is not None:
+            self.blocked[reason] += 1
+            await route.abort("blockedbyclient")
+            return
+        self.allowed += 1
+        if self.cacheable(request):
+            await self._serve_asset(route)
+        else:
+            await route.continue_()
+
+    async def _serve_asset(self, route):
+        """
+        Отдаёт скрипт или стиль из кэша, при промахе загружает и сохраняет.
+        При любой ошибке запрос пропускается к серверу как обычно, иначе
+        страница ждала бы его до таймаута.
+        """
+        request = route.request
+        try:
+            body = await self.asset_cache.get(request.url)
+            if body is not None:
+                self.assets["hit"] += 1
+                headers = {
+                    "content-type": ASSET_CONTENT_TYPES[request.resource_type],
+                    "access-control-allow-origin": "*",
+                }
+                await route.fulfill(status=200, headers=headers, body=body)
+                return
+
+            self.assets["miss"] += 1
+            response = await route.fetch()
+            cache_control = response.headers.get("cache-control", "")
+            if response.status == 200 and "no-store" not in cache_control:
+                await self.asset_cache.put(request.url, await response.body())
+            await route.fulfill(response=response)
+        except Exception as e:
+            self.assets["error"] += 1
+            logger.warning(f"Статика {request.url} не обработана кэшем: {e!r}")
+            await route.continue_()
+
+    def _on_response(self, response):
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            self.loaded_bytes += int(length)
+
+    def report(self):
+        """
+        Записывает статистику в метрики текущей задачи и в лог.
+        """
+        for reason, value in self.blocked.items():
+            count("search_blocked_requests_total", value, reason=reason)
+        count("search_allowed_requests_total", self.allowed)
+        count("search_page_bytes_total", self.loaded_bytes)
+        for result, value in self.assets.items():
+            count("search_asset_cache_total", value, result=result)
+        logger.info(
+            f"Запросы страницы: пропущено {self.allowed} ({self.loaded_bytes} байт), "
+            f"заблокировано {sum(self.blocked.values())} {dict(self.blocked)}, "
+            f"статика из кэша {self.assets['hit']}/{self.assets['hit'] + self.assets['miss']}"
+        )
+
+
+def make_request_filter():
+    """
+    Фильтр по настройкам BLOCK_RESOURCE_TYPES, BLOCK_DOMAINS и
+    ASSET_CACHE_DOMAINS или None, если выключены и блокировка
+    (REQUEST_BLOCKING), и кэш статики (ASSET_CACHE_ENABLED).
+    """
+    blocking = settings.REQUEST_BLOCKING
+    if not blocking and not asset_cache.enabled:
+        return None
+    return RequestFilter(
+        settings.BLOCK_RESOURCE_TYPES if blocking else (),
+        settings.BLOCK_DOMAINS if blocking else (),
+        asset_cache=asset_cache,
+        asset_domains=settings.ASSET_CACHE_DOMAINS,
+    )
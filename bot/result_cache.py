@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Параметры ссылки, которые не влияют на выдачу
+IGNORED_QUERY_PARAMS = {"utm_source", "utm_medium", "utm_campaign", "utm_content", "utm_term"}
+
+
+def normalize_url(url):
+    """
+    Приводит ссылку на поиск к каноническому виду: схема и хост в нижнем
+    регистре без www, без фрагмента и меток utm, параметры отсортированы.
+
+    :param url: Ссылка на выдачу Avito.
+    :return: Нормализованная ссылка.
+    """
+    parts = urlsplit(url.strip().replace(" ", "+"))
+    netloc = parts.netloc.lower()
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in IGNORED_QUERY_PARAMS
+    )
+    return urlunsplit(
+        (
+            (parts.scheme or "https").lower(),
+            netloc,
+            parts.path.rstrip("/") or "/",
+            urlencode(query),
+            "",
+        )
+    )
+
+
+# ---------------------------------------------------------------------
+# Хранилища результатов
+# ---------------------------------------------------------------------
+
+
+class MemoryBackend:
+    """
+    Хранилище в памяти процесса. Подходит для одного процесса бота и тестов.
+
+    Просроченные записи удаляются при чтении и при записи, но не чаще
+    раза в sweep_interval секунд, чтобы уникальные ссылки не копились.
+    """
+
+    def __init__(self, sweep_interval=60):
+        self._data = {}
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    async def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key, value, ttl):
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            expired = [k for k, (expires_at, _) in self._data.items() if expires_at < now]
+            for k in expired:
+                del self._data[k]
+        self._data[key] = (now + ttl, value)
+
+    async def acquire(self, key, ttl):
+        # В пределах процесса одновременные запросы объединяет ResultCache
+        return True
+
+    async def release(self, key):
+        pass
+
+
+class RedisBackend:
+    """
+    Хранилище в Redis, общее для всех процессов бота и воркеров.
+    Значения сериализуются в JSON. Вместо настоящего Redis можно передать
+    совместимый клиент, например fakeredis.aioredis.FakeRedis().
+    """
+
+    def __init__(self, url=None, client=None, prefix="search_bot:results:"):
+        if client is None:
+            import redis.asyncio
+
+            client = redis.asyncio.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._tokens = {}
+
+    async def get(self, key):
+        raw = await self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key, value, ttl):
+        await self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+    async def acquire(self, key, ttl):
+        token = uuid.uuid4().hex
+        if await self.client.set(f"{self.prefix}lock:{key}", token, nx=True, ex=ttl):
+            self._tokens[key] = token
+            return True
+        return False
+
+    async def release(self, key):
+        token = self._tokens.pop(key, None)
+        lock_key = f"{self.prefix}lock:{key}"
+        if token is not None:
+            current = await self.client.get(lock_key)
+            if current is not None and current.decode() == token:
+                await self.client.delete(lock_key)
+
+
+# ---------------------------------------------------------------------
+# Кэш результатов поиска с объединением одинаковых запросов
+# ---------------------------------------------------------------------
+
+
+class ResultCache:
+    """
+    Хранит результаты парсинга по нормализованной ссылке в течение ttl секунд.
+
+    Одинаковые запросы, пришедшие во время парсинга, ждут один общий
+    парсинг (single-flight) вместо запуска своего. Если парсинг уже идёт
+    в другом процессе (захвачена блокировка в Redis), результат ожидается
+    из хранилища.
+    """
+
+    def __init__(self, backend, ttl=600, lock_ttl=180, poll_interval=0.5):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    @staticmethod
+    def make_key(url, **params):
+        key = normalize_url(url)
+        for name, value in sorted(params.items()):
+            key += f"#{name}={value}"
+        return key
+
+    async def get_or_fetch(self, url, fetch, **params):
+        """
+        Возвращает результат из кэша или получает его через fetch().
+
+        :param url: Ссылка на выдачу Avito.
+        :param fetch: Функция без аргументов, возвращающая корутину парсинга.
+            Результат должен сериализоваться в JSON.
+        :param params: Дополнительные параметры, влияющие на результат (limit).
+        :return: Результат парсинга.
+        """
+        key = self.make_key(url, **params)
+
+        cached = await self.backend.get(key)
+        if cached is not None:
+            self.hits += 1
+            logger.info(f"Результат найден в кэше: {key}")
+            return cached
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch_and_store(key, fetch))
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            logger.info(f"Запрос присоединён к уже идущему парсингу: {key}")
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Парсинг отменяется, только когда его больше никто не ждёт
+            if not task.done() and entry[1] == 1:
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    async def _fetch_and_store(self, key, fetch):
+        while not await self.backend.acquire(key, self.lock_ttl):
+            await asyncio.sleep(self.poll_interval)
+            cached = await self.backend.get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            result = await fetch()
+            await self.backend.set(key, result, self.ttl)
+            return result
+        finally:
+            await self.backend.release(key)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+
+def make_backend(name):
+    if name == "redis":
+        return RedisBackend(settings.REDIS_URL)
+    return MemoryBackend()
+
+
+result_cache = ResultCache(
+    make_backend(settings.RESULT_CACHE_BACKEND),
+    ttl=settings.RESULT_CACHE_TTL,
+)
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import math
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------
+# Справедливая очередь поисков
+# ---------------------------------------------------------------------
+
+
+class FairScheduler:
+    """
+    Пропускает к парсингу не больше max_concurrent задач одновременно.
+
+    У каждого пользователя своя очередь глубиной не больше max_user_jobs
+    (ожидающие плюс выполняемые). Свободный слот достаётся пользователям
+    по кругу (round-robin), поэтому один пользователь с десятком ссылок
+    не задерживает остальных.
+
+    Задачи пользователя (ожидающие и выполняемые) можно отменить через
+    cancel(). Выполняемая задача получает CancelledError и закрывает
+    свои ресурсы (вкладки, контексты браузера) в блоках finally.
+
+    Состояние очереди хранится в памяти процесса. Несколько процессов
+    (воркеры ASGI в режиме webhook) не знают о задачах друг друга.
+    """
+
+    def __init__(self, max_concurrent=4, max_user_jobs=3, avg_job_seconds=30.0):
+        self.max_concurrent = max_concurrent
+        self.max_user_jobs = max_user_jobs
+        self.avg_job_seconds = avg_job_seconds
+        self._queues = OrderedDict()
+        self._running = {}
+        self._tasks = set()
+
+    @property
+    def running(self):
+        return sum(len(tasks) for tasks in self._running.values())
+
+    @property
+    def queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _position(self, user_id):
+        """
+        Сколько задач запустится раньше новой задачи пользователя:
+        его собственные ожидающие задачи и по столько же задач (плюс одна)
+        от каждого другого пользователя.
+        """
+        own = len(self._queues.get(user_id, ()))
+        others = sum(
+            min(len(queue), own + 1)
+            for other, queue in self._queues.items()
+            if other != user_id
+        )
+        return own + others
+
+    def estimate_wait(self, position):
+        """
+        :param position: Сколько задач в очереди перед задачей.
+        :return: Примерное ожидание в секундах.
+        """
+        return math.ceil((position + 1) / self.max_concurrent) * self.avg_job_seconds
+
+    def submit(self, user_id, job):
+        """
+        Ставит задачу пользователя в очередь.
+
+        :param user_id: ID пользователя Telegram.
+        :param job: Функция без аргументов, возвращающая корутину.
+        :return: Позиция в очереди (0 - задача запущена сразу)
+            и примерное ожидание в секундах.
+        :raises QueueFull: Если у пользователя уже max_user_jobs задач.
+        """
+        queue = self._queues.get(user_id, ())
+        if len(queue) + len(self._running.get(user_id, ())) >= self.max_user_jobs:
+            raise QueueFull(user_id)
+
+        position = self._position(user_id)
+        self._queues.setdefault(user_id, deque()).append(job)
+        self._dispatch()
+
+        if job not in self._queues.get(user_id, ()):
+            return 0, 0
+        return position + 1, self.estimate_wait(position)
+
+    def cancel(self, user_id):
+        """
+        Отменяет все задачи пользователя: ожидающие убираются из очереди,
+        выполняемые отменяются.
+
+        :return: Количество отменённых задач.
+        """
+        queued = len(self._queues.pop(user_id, ()))
+        # Задачи, которые уже отменяются, повторно не считаются
+        running = [task for task in self._running.get(user_id, ()) if not task.cancelling()]
+        for task in running:
+            task.cancel()
+        if queued or running:
+            logger.info(
+                f"Задачи пользователя {user_id} отменены: "
+                f"в очереди {queued}, выполнялось {len(running)}"
+            )
+        return queued + len(running)
+
+    async def join(self):
+        """
+        Ждёт, пока не завершатся все запущенные и ожидающие задачи.
+        """
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _dispatch(self):
+        while self.running < self.max_concurrent and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            self._start(user_id, job)
+
+    def _start(self, user_id, job):
+        task = asyncio.create_task(self._run(user_id, job))
+        self._running.setdefault(user_id, set()).add(task)
+        self._tasks.add(task)
+        # Учёт ведётся в колбэке, а не в finally корутины: задача, отменённая
+        # до первого шага, в _run не попадает
+        task.add_done_callback(lambda done: self._finish(user_id, done))
+
+    def _finish(self, user_id, task):
+        self._tasks.discard(task)
+        tasks = self._running.get(user_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._running[user_id]
+        self._dispatch()
+
+    async def _run(self, user_id, job):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            await job()
+            # Отменённые задачи не учитываются в оценке длительности
+            duration = loop.time() - started
+            self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * duration
+        except asyncio.CancelledError:
+            logger.info(f"Задача пользователя {user_id} отменена")
+            raise
+        except Exception as e:
+            logger.exception(f"Задача пользователя {user_id} завершилась с ошибкой: {e}")
+
+
+scheduler = FairScheduler(
+    max_concurrent=settings.SCRAPE_MAX_CONCURRENT,
+    max_user_jobs=settings.SCRAPE_USER_QUEUE_DEPTH,
+    avg_job_seconds=settings.SCRAPE_AVG_JOB_SECONDS,
+)
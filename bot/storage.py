@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from bot.listing import Listing
+from bot.models import ScrapedListing
+
+# ---------------------------------------------------------------------
+# Сохранение результатов поиска в БД
+# ---------------------------------------------------------------------
+
+
+def save_listings(query, listings):
+    """
+    Сохраняет результаты одного поиска одним bulk_create. У всех записей
+    одного поиска одинаковое время парсинга, по нему они выбираются обратно.
+
+    :param query: Ключ поиска (нормализованная ссылка).
+    :param listings: Список объектов Listing в порядке выдачи.
+    """
+    scraped_at = timezone.now()
+    ScrapedListing.objects.bulk_create(
+        [
+            ScrapedListing(
+                query=query,
+                position=position,
+                listing_id=listing.id[:255],
+                url=listing.url[:1000],
+                title=listing.title[:500],
+                price=listing.price,
+                price_raw=listing.price_raw[:100],
+                seller=listing.seller[:255],
+                rating=listing.rating,
+                reviews=listing.reviews,
+                text=listing.text,
+                image_url=listing.image_url and listing.image_url[:1000],
+                scraped_at=scraped_at,
+            )
+            for position, listing in enumerate(listings)
+        ],
+        batch_size=500,
+    )
+
+
+def load_recent_listings(query, max_age):
+    """
+    Возвращает результаты последнего поиска по запросу, если он был не
+    раньше max_age секунд назад.
+
+    :param query: Ключ поиска (нормализованная ссылка).
+    :param max_age: Максимальный возраст результатов в секундах.
+    :return: Список объектов Listing или None.
+    """
+    latest = (
+        ScrapedListing.objects.filter(query=query)
+        .order_by("-scraped_at")
+        .values_list("scraped_at", flat=True)
+        .first()
+    )
+    if latest is None or latest < timezone.now() - timedelta(seconds=max_age):
+        return None
+
+    rows = ScrapedListing.objects.filter(query=query, scraped_at=latest).order_by("position")
+    return [
+        Listing(
+            id=row.listing_id,
+            url=row.url,
+            title=row.title,
+            price=row.price,
+            price_raw=row.price_raw,
+            seller=row.seller,
+            rating=row.rating,
+            reviews=row.reviews,
+            text=row.text,
+            image_url=row.image_url,
+        )
+        for row in rows
+    ]
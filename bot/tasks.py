@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import threading
+
+from celery import shared_task
+from celery.signals import worker_process_init, worker_process_shutdown
+from django.conf import settings
+from telegram import Bot
+
+from bot import http_parser
+from bot.browser_pool import browser_pool
+from bot.downloader import image_downloader
+from bot.handlers import ERROR_REPLY, TIMEOUT_REPLY, build_report
+from bot.metrics import stage, track_job
+from search_bot.celery import app
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Event loop воркера
+# ---------------------------------------------------------------------
+# Пул браузеров, сессия aiohttp и бот привязаны к event loop, поэтому
+# у каждого процесса воркера один долгоживущий loop в отдельном потоке,
+# а задачи отправляют в него свои корутины.
+
+_loop = None
+_loop_lock = threading.Lock()
+_bot = None
+
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="search-jobs-loop", daemon=True
+            ).start()
+    return _loop
+
+
+def run_async(coro):
+    """
+    Выполняет корутину в event loop воркера и ждёт результат.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+async def _get_bot():
+    global _bot
+    if _bot is None:
+        _bot = Bot(settings.API_KEY)
+        await _bot.initialize()
+    return _bot
+
+
+# ---------------------------------------------------------------------
+# Задача поиска
+# ---------------------------------------------------------------------
+
+
+async def _run_search_job(task, task_id, chat_id, query, reply_to):
+    bot = await _get_bot()
+
+    async def notify(stage, text):
+        task.update_state(task_id, state="PROGRESS", meta={"stage": stage})
+        if text:
+            await bot.send_message(chat_id, text, reply_to_message_id=reply_to)
+
+    try:
+        async with track_job(task_id) as job:
+            try:
+                async with asyncio.timeout(settings.SEARCH_JOB_TIMEOUT):
+                    pdf = await build_report(query, notify)
+
+                    await notify("sending", None)
+                    with stage("upload", size=len(pdf)):
+                        await bot.send_document(
+                            chat_id, pdf, filename="output.pdf", reply_to_message_id=reply_to
+                        )
+            except TimeoutError:
+                job.status = "timeout"
+                logger.warning(f"Задача {task_id} не уложилась в {settings.SEARCH_JOB_TIMEOUT} с")
+                await bot.send_message(chat_id, TIMEOUT_REPLY, reply_to_message_id=reply_to)
+                return
+            logger.info(f"PDF отправлен в чат {chat_id}")
+    except Exception:
+        await bot.send_message(chat_id, ERROR_REPLY, reply_to_message_id=reply_to)
+        raise
+
+
+@shared_task(bind=True, name="bot.search_job")
+def search_job(self, chat_id, query, reply_to=None):
+    """
+    Выполняет поиск по ссылке и отправляет PDF в чат.
+
+    :param chat_id: Чат, куда отправить результат.
+    :param query: Ссылка на выдачу Avito.
+    :param reply_to: ID сообщения пользователя, на которое отвечать.
+    """
+    # self.request привязан к потоку задачи, поэтому id передаётся явно
+    task_id = self.request.id
+    logger.info(f"Задача {task_id}: поиск для чата {chat_id}: {query}")
+    run_async(_run_search_job(self, task_id, chat_id, query, reply_to))
+    return {"chat_id": chat_id, "query": query}
+
+
+def get_job_status(job_id):
+    """
+    :param job_id: ID задачи Celery.
+    :return: Состояние задачи и текущий этап (или None).
+    """
+    result = app.AsyncResult(job_id)
+    info = result.info
+    stage = info.get("stage") if isinstance(info, dict) else None
+    return result.state, stage
+
+
+@worker_process_init.connect
+def use_worker_threads(**kwargs):
+    # Процесс воркера prefork демонический: ProcessPoolExecutor в нём
+    # падает с "daemonic processes are not allowed to have children"
+    from bot import pdf, thumbnails
+
+    thumbnails.use_threads()
+    pdf.use_threads()
+
+
+@worker_process_shutdown.connect
+def close_worker_resources(**kwargs):
+    if _loop is None:
+        return
+
+    async def close():
+        await browser_pool.close()
+        await image_downloader.close()
+        await http_parser.close_session()
+        if _bot is not None:
+            await _bot.shutdown()
+
+    run_async(close())
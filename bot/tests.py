@@ -0,0 +1,936 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from html import escape
+from types import SimpleNamespace
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, patch
+from urllib.parse import quote
+
+import fakeredis
+from aiohttp import web
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from bot import http_parser, pdf
+from bot.bench.fixtures import TITLES, FixtureServer, render_search_page, sample_listings
+from bot.browser_pool import BrowserPool
+from bot.downloader import ImageDownloader, image_downloader
+from bot.handlers import build_report
+from bot.image_cache import ImageCache
+from bot.listing import Listing, parse_price, parse_seller_stats
+from bot.parser import CARD_FIELDS, extract_cards_legacy
+from bot.profiles import ProfileStore
+from bot.request_filter import RequestFilter
+from bot.result_cache import MemoryBackend, RedisBackend, ResultCache, normalize_url
+from bot.scheduler import FairScheduler, QueueFull
+from bot.thumbnails import ThumbnailStats
+
+
+# ---------------------------------------------------------------------
+# Очередь поисков
+# ---------------------------------------------------------------------
+
+
+class FairSchedulerTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.started = []
+        self.release = asyncio.Event()
+
+    def job(self, name, wait=False):
+        async def run():
+            self.started.append(name)
+            if wait:
+                await self.release.wait()
+
+        return run
+
+    async def test_round_robin_between_users(self):
+        scheduler = FairScheduler(max_concurrent=1, max_user_jobs=5)
+        self.assertEqual(scheduler.submit(1, self.job("a0", wait=True)), (0, 0))
+        scheduler.submit(1, self.job("a1"))
+        scheduler.submit(1, self.job("a2"))
+        position, _ = scheduler.submit(2, self.job("b1"))
+        scheduler.submit(3, self.job("c1"))
+        # Перед b1 только одна ожидающая задача пользователя 1
+        self.assertEqual(position, 2)
+
+        self.release.set()
+        await scheduler.join()
+        self.assertEqual(self.started, ["a0", "a1", "b1", "c1", "a2"])
+        self.assertEqual(scheduler.running, 0)
+
+    async def test_queue_full(self):
+        scheduler = FairScheduler(max_concurrent=1, max_user_jobs=2)
+        scheduler.submit(1, self.job("a0", wait=True))
+        scheduler.submit(1, self.job("a1"))
+        with self.assertRaises(QueueFull):
+            scheduler.submit(1, self.job("a2"))
+        # Лимит считается для каждого пользователя отдельно
+        scheduler.submit(2, self.job("b1"))
+
+        self.release.set()
+        await scheduler.join()
+        self.assertEqual(self.started, ["a0", "a1", "b1"])
+
+    async def test_cancel_before_first_step_frees_slot(self):
+        scheduler = FairScheduler(max_concurrent=1)
+        scheduler.submit(1, self.job("a0"))
+        self.assertEqual(scheduler.cancel(1), 1)
+        scheduler.submit(2, self.job("b1"))
+
+        await scheduler.join()
+        self.assertEqual(self.started, ["b1"])
+        self.assertEqual(scheduler.running, 0)
+
+    async def test_cancel_running_and_queued(self):
+        scheduler = FairScheduler(max_concurrent=1)
+        scheduler.submit(1, self.job("a0", wait=True))
+        scheduler.submit(1, self.job("a1"))
+        scheduler.submit(2, self.job("b1"))
+        await asyncio.sleep(0)
+
+        self.assertEqual(scheduler.cancel(1), 2)
+        self.assertEqual(scheduler.cancel(1), 0)
+        await scheduler.join()
+        self.assertEqual(self.started, ["a0", "b1"])
+        self.assertEqual((scheduler.running, scheduler.queued), (0, 0))
+
+
+# ---------------------------------------------------------------------
+# Кэш результатов поиска
+# ---------------------------------------------------------------------
+
+
+class NormalizeUrlTests(TestCase):
+    def test_equivalent_links_match(self):
+        expected = "https://avito.ru/moskva/telefony?p=2&q=iphone+13"
+        for url in (
+            "https://www.avito.ru/moskva/telefony/?q=iphone+13&p=2",
+            "HTTPS://WWW.Avito.ru/moskva/telefony?p=2&q=iphone 13#top",
+            " https://avito.ru/moskva/telefony?q=iphone+13&p=2&utm_source=tg ",
+        ):
+            self.assertEqual(normalize_url(url), expected)
+
+    def test_path_and_query_values_kept(self):
+        self.assertNotEqual(
+            normalize_url("https://avito.ru/moskva?q=iphone"),
+            normalize_url("https://avito.ru/spb?q=iphone"),
+        )
+        self.assertNotEqual(
+            normalize_url("https://avito.ru/moskva?q=iphone"),
+            normalize_url("https://avito.ru/moskva?q=samsung"),
+        )
+
+
+class ResultCacheTests(IsolatedAsyncioTestCase):
+    def make_fetch(self, result, calls, delay=0.05):
+        async def fetch():
+            calls.append(result)
+            await asyncio.sleep(delay)
+            return result
+
+        return fetch
+
+    async def test_single_flight_in_process(self):
+        cache = ResultCache(MemoryBackend(), ttl=60)
+        calls = []
+        fetch = self.make_fetch(["listing"], calls)
+        results = await asyncio.gather(
+            *(cache.get_or_fetch("https://avito.ru/moskva?q=x", fetch) for _ in range(5))
+        )
+
+        self.assertEqual(results, [["listing"]] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 1, "coalesced": 4})
+
+        # Повторный запрос, в том числе по эквивалентной ссылке, - из кэша
+        await cache.get_or_fetch("https://www.avito.ru/moskva/?q=x", fetch)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.hits, 1)
+
+    async def test_cancelled_waiter_keeps_shared_fetch(self):
+        cache = ResultCache(MemoryBackend(), ttl=60)
+        calls = []
+        fetch = self.make_fetch(["listing"], calls, delay=0.1)
+        first = asyncio.create_task(cache.get_or_fetch("https://avito.ru/a", fetch))
+        second = asyncio.create_task(cache.get_or_fetch("https://avito.ru/a", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        self.assertEqual(await second, ["listing"])
+        self.assertEqual(len(calls), 1)
+
+    async def test_lock_shared_between_processes(self):
+        # Два кэша с общим Redis - как два процесса бота
+        server = fakeredis.FakeServer()
+        caches = [
+            ResultCache(
+                RedisBackend(client=fakeredis.aioredis.FakeRedis(server=server)),
+                ttl=60,
+                poll_interval=0.01,
+            )
+            for _ in range(2)
+        ]
+        calls = []
+        fetch = self.make_fetch(["listing"], calls, delay=0.1)
+        results = await asyncio.gather(
+            *(cache.get_or_fetch("https://avito.ru/b", fetch) for cache in caches)
+        )
+
+        self.assertEqual(results, [["listing"], ["listing"]])
+        self.assertEqual(len(calls), 1)
+        # Блокировка снята после парсинга
+        client = caches[0].backend.client
+        self.assertEqual(await client.keys("*lock*"), [])
+
+
+class MemoryBackendTests(IsolatedAsyncioTestCase):
+    async def test_expired_entries_swept_on_set(self):
+        backend = MemoryBackend(sweep_interval=0)
+        await backend.set("old", 1, ttl=-1)
+        await backend.set("new", 2, ttl=60)
+        self.assertEqual(list(backend._data), ["new"])
+
+
+# ---------------------------------------------------------------------
+# Задачи Celery
+# ---------------------------------------------------------------------
+
+
+class FakeBot:
+    def __init__(self):
+        self.documents = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        pass
+
+    async def send_document(self, chat_id, document, **kwargs):
+        self.documents.append(document)
+
+
+def _run_search_job_in_child(result):
+    """
+    Выполняет search_job так же, как процесс воркера prefork: в демоническом
+    процессе после сигнала worker_process_init.
+    """
+    from celery.signals import worker_process_init
+
+    from bot.bench.fixtures import sample_image, sample_listings
+    from bot.pdf import IMG_HEIGHT, IMG_WIDTH, generate_pdf_file
+    from bot.tasks import search_job
+    from bot.thumbnails import thumbnail_images
+
+    bot = FakeBot()
+
+    async def get_bot():
+        return bot
+
+    async def build_report(query, notify):
+        _, listings = sample_listings(5)
+        pics = [sample_image(seed=i) for i in range(5)]
+        thumbs, _ = await thumbnail_images(pics, IMG_WIDTH, IMG_HEIGHT)
+        return await generate_pdf_file(thumbs, listings)
+
+    try:
+        worker_process_init.send(sender=None)
+        with (
+            patch("bot.tasks._get_bot", get_bot),
+            patch("bot.tasks.build_report", build_report),
+            patch.object(search_job, "update_state"),
+        ):
+            # Результат не сохраняется: в тестах нет брокера и бэкенда
+            search_job.apply(args=(1, "https://www.avito.ru/moskva?q=x"), ignore_result=True).get()
+        result.put(bot.documents[0][:5])
+    except Exception as e:
+        result.put(repr(e))
+
+
+class SearchJobTests(TestCase):
+    def test_search_job_in_prefork_worker_process(self):
+        context = multiprocessing.get_context("fork")
+        result = context.Queue()
+        child = context.Process(target=_run_search_job_in_child, args=(result,), daemon=True)
+        child.start()
+        try:
+            self.assertEqual(result.get(timeout=60), b"%PDF-")
+        finally:
+            child.join(10)
+
+
+# ---------------------------------------------------------------------
+# Пул браузеров
+# ---------------------------------------------------------------------
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class FakePlaywright:
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.browsers = []
+        self.stopped = False
+        self.chromium = self
+
+    async def start(self):
+        return self
+
+    async def launch(self, headless):
+        if len(self.browsers) == self.fail_at:
+            raise RuntimeError("launch failed")
+        self.browsers.append(FakeBrowser())
+        return self.browsers[-1]
+
+    async def stop(self):
+        self.stopped = True
+
+
+class FakeProfileStore:
+    def __init__(self):
+        self.released = 0
+
+    def acquire(self):
+        return SimpleNamespace(release=self.release)
+
+    def release(self):
+        self.released += 1
+
+
+class BrowserPoolTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.profiles = FakeProfileStore()
+        patcher = patch("bot.browser_pool.profile_store", self.profiles)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def use_playwright(self, playwright):
+        return patch("bot.browser_pool.async_playwright", lambda: playwright)
+
+    async def test_failed_launch_leaves_pool_stopped(self):
+        pool = BrowserPool(size=2)
+        failing = FakePlaywright(fail_at=1)
+        with self.use_playwright(failing), self.assertRaises(RuntimeError):
+            await pool.start()
+
+        self.assertFalse(pool.started)
+        self.assertTrue(failing.stopped)
+        self.assertTrue(failing.browsers[0].closed)
+        self.assertEqual(self.profiles.released, 2)
+        self.assertEqual(pool.stats()["browsers"], 0)
+
+        # Следующий поиск запускает пул заново
+        with self.use_playwright(FakePlaywright()):
+            slot = await pool._acquire_slot()
+        self.assertEqual(pool.stats()["browsers"], 2)
+        await pool._release_slot(slot)
+        await pool.close()
+
+    async def test_close_includes_retired_browsers(self):
+        pool = BrowserPool(size=1, max_jobs=1)
+        playwright = FakePlaywright()
+        with self.use_playwright(playwright):
+            await pool.start()
+        busy = await pool._acquire_slot()
+        # Лимит отработан: выдаётся новый браузер, старый ещё занят
+        fresh = await pool._acquire_slot()
+        self.assertIsNot(busy, fresh)
+
+        await pool.close()
+        self.assertTrue(all(browser.closed for browser in playwright.browsers))
+        self.assertEqual(pool.stats()["browsers"], 0)
+        self.assertEqual(self.profiles.released, 1)
+
+
+# ---------------------------------------------------------------------
+# Объявление и разбор полей карточки
+# ---------------------------------------------------------------------
+
+
+class ListingTests(TestCase):
+    def test_parse_price(self):
+        cases = {
+            "54 990 ₽": 54990,
+            "54\xa0990\xa0₽": 54990,
+            "1 500 – 2 000 ₽": 1500,
+            "2,5 млн ₽": 2500000,
+            "от 300 тыс. ₽": 300000,
+            "Бесплатно": None,
+            "Цена не указана": None,
+            "": None,
+            None: None,
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_price(text), expected)
+
+    def test_parse_seller_stats(self):
+        cases = {
+            "4,8 127 отзывов": (4.8, 127),
+            "5.0\xa01\xa0234 отзыва": (5.0, 1234),
+            "Нет отзывов": (None, 0),
+            "Частное лицо": (None, None),
+            None: (None, None),
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_seller_stats(text), expected)
+
+    def test_price_text_keeps_original_string(self):
+        listing = Listing(
+            id="1",
+            url="https://www.avito.ru/1",
+            title="Котёнок",
+            price=parse_price("Бесплатно"),
+            seller="Частное лицо",
+            rating=None,
+            reviews=None,
+            text="",
+            image_url=None,
+            price_raw="Бесплатно",
+        )
+        self.assertEqual(listing.price_text, "Бесплатно")
+        listing.price_raw = ""
+        self.assertEqual(listing.price_text, "Не указана")
+        listing.price = 54990
+        self.assertEqual(listing.price_text, "54 990 ₽")
+
+    def test_dict_round_trip(self):
+        listing = Listing(
+            id="42",
+            url="https://www.avito.ru/moskva/telefony/iphone_42",
+            title="iPhone 13",
+            price=1500,
+            seller="ИП Иванов",
+            rating=4.8,
+            reviews=127,
+            text="Описание",
+            image_url="https://img.avito.st/1.jpg",
+            price_raw="1 500 – 2 000 ₽",
+        )
+        self.assertEqual(Listing.from_dict(listing.to_dict()), listing)
+        # Записи в кэше, сохранённые до появления price_raw
+        data = listing.to_dict()
+        del data["price_raw"]
+        self.assertEqual(Listing.from_dict(data).price_text, "1 500 ₽")
+
+
+# ---------------------------------------------------------------------
+# Выдача без браузера
+# ---------------------------------------------------------------------
+
+BASE_URL = "https://www.avito.ru/moskva/telefony?q=iphone"
+
+STATE_ITEMS = [
+    {
+        "id": 101,
+        "title": "iPhone 13, 128 ГБ",
+        "urlPath": "/moskva/telefony/iphone_13_101",
+        "priceDetailed": {"value": 54990, "string": "54 990 ₽"},
+        "userInfo": {"title": "ИП Иванов", "rating": "4,8", "reviewCount": "127"},
+        "description": "Отличное состояние",
+        "images": [
+            {"208x156": "https://img.avito.st/s/101", "472x354": "https://img.avito.st/l/101"}
+        ],
+    },
+    {
+        "id": 102,
+        "title": "iPhone 12 на запчасти",
+        "urlPath": "/moskva/telefony/iphone_12_102",
+        "price": "Бесплатно",
+        "seller": {"name": "Пётр"},
+        "images": ["https://img.avito.st/102.jpg"],
+    },
+]
+
+
+class HttpParserTests(TestCase):
+    def test_cards_from_fixture_html(self):
+        html = render_search_page(1, per_page=20)
+        records = http_parser.extract_cards_html(html, BASE_URL)
+        self.assertEqual(len(records), 20)
+        first = records[1]
+        self.assertEqual(first["title"], TITLES[1])
+        self.assertTrue(first["url"].startswith("https://www.avito.ru/moskva/telefony/"))
+        self.assertTrue(first["url"].endswith("_1"))
+        self.assertEqual(first["image"], "https://www.avito.ru/images/1.jpg?item=1")
+        self.assertEqual(first["price"], "30 010 ₽")
+
+        listings = http_parser.extract_listings(html, BASE_URL)
+        self.assertEqual([listing.id for listing in listings], [str(i) for i in range(20)])
+        self.assertEqual(listings[1].price, 30010)
+        self.assertEqual(listings[0].price_text, "Цена не указана")
+
+    def test_select(self):
+        builder = http_parser._TreeBuilder()
+        builder.feed('<div class="a b"><p>one</p><div class="c"><p>two</p></div></div><p>three</p>')
+        root = builder.root
+        self.assertEqual([n.text() for n in http_parser.select(root, "div.a p")], ["one", "two"])
+        self.assertEqual([n.text() for n in http_parser.select(root, "div.c p")], ["two"])
+        self.assertEqual(len(http_parser.select(root, "p")), 3)
+        self.assertEqual(http_parser.select(root, "div.d p"), [])
+
+    def test_mfe_state(self):
+        state = json.dumps({"data": {"catalog": {"items": STATE_ITEMS}}}, ensure_ascii=False)
+        html = (
+            f'<html><body><script type="mime/invalid" data-mfe-state="true">'
+            f"{escape(state)}</script></body></html>"
+        )
+        listings = http_parser.extract_listings(html, BASE_URL)
+
+        self.assertEqual([listing.id for listing in listings], ["101", "102"])
+        first, second = listings
+        self.assertEqual(first.url, "https://www.avito.ru/moskva/telefony/iphone_13_101")
+        self.assertEqual((first.price, first.price_text), (54990, "54 990 ₽"))
+        self.assertEqual((first.seller, first.rating, first.reviews), ("ИП Иванов", 4.8, 127))
+        self.assertEqual(first.image_url, "https://img.avito.st/l/101")
+        self.assertEqual((second.price, second.price_text), (None, "Бесплатно"))
+        self.assertEqual(second.seller, "Пётр")
+        self.assertEqual(second.image_url, "https://img.avito.st/102.jpg")
+
+    def test_initial_data(self):
+        state = json.dumps({"catalog": {"items": STATE_ITEMS[:1]}}, ensure_ascii=False)
+        html = f'<script>window.__initialData__ = "{quote(state)}";</script>'
+        listings = http_parser.extract_embedded_listings(html, BASE_URL)
+        self.assertEqual([listing.title for listing in listings], ["iPhone 13, 128 ГБ"])
+
+    def test_broken_state_is_skipped(self):
+        html = '<script>{"items": [{"id": 1</script><script>[1, 2, 3]</script>'
+        self.assertEqual(http_parser.extract_listings(html, BASE_URL), [])
+
+
+class FetchPageTests(IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        await http_parser.close_session()
+        await image_downloader.close()
+
+    async def test_pages_use_verified_session(self):
+        session = http_parser.get_session()
+        self.assertIsNot(session, image_downloader.session)
+        self.assertIs(session.connector._ssl, True)
+
+        async with FixtureServer(per_page=5) as server:
+            html = await http_parser.fetch_page(server.url("/moskva?p=2"))
+            listings = await http_parser.fetch_listings(server.url("/moskva"), limit=8, pages=2)
+        self.assertIn('data-item-id="5"', html)
+        self.assertEqual(len(listings), 8)
+
+    async def test_connection_error(self):
+        with self.assertRaises(http_parser.FastPathError):
+            await http_parser.fetch_page("http://127.0.0.1:1/moskva")
+
+
+# ---------------------------------------------------------------------
+# Генерация PDF
+# ---------------------------------------------------------------------
+
+
+class GeneratePdfTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.finish = threading.Event()
+        self.rendered = []
+        patcher = patch.multiple(
+            "bot.pdf",
+            _semaphore=None,
+            _executor=None,
+            _use_processes=False,
+            render_pdf=self.render,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(pdf.shutdown_executor)
+        self.addCleanup(self.finish.set)
+
+    def render(self, pics_array, listings):
+        self.finish.wait(5)
+        self.rendered.append(listings)
+        return b"%PDF-"
+
+    async def test_timed_out_render_keeps_slot(self):
+        with override_settings(PDF_WORKERS=1):
+            with self.assertRaises(asyncio.TimeoutError):
+                await pdf.generate_pdf_file([], ["first"], timeout=0.05)
+            # Первый PDF ещё рендерится: второй ждёт места, а не очереди пула
+            second = asyncio.create_task(pdf.generate_pdf_file([], ["second"], timeout=0.2))
+            await asyncio.sleep(0.3)
+            self.assertFalse(second.done())
+            self.assertTrue(pdf._semaphore.locked())
+
+            self.finish.set()
+            self.assertEqual(await second, b"%PDF-")
+        self.assertEqual(self.rendered, [["first"], ["second"]])
+        self.assertFalse(pdf._semaphore.locked())
+
+
+# ---------------------------------------------------------------------
+# Webhook Telegram
+# ---------------------------------------------------------------------
+
+
+@override_settings(WEBHOOK_SECRET="s3cret")
+class TelegramWebhookTests(SimpleTestCase):
+    def setUp(self):
+        patcher = patch("bot.views.process_update", new_callable=AsyncMock)
+        self.process_update = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body, token="s3cret"):
+        headers = {} if token is None else {"X-Telegram-Bot-Api-Secret-Token": token}
+        return self.client.post(
+            reverse("telegram-webhook"), body, content_type="application/json", headers=headers
+        )
+
+    def test_disabled_without_secret(self):
+        with override_settings(WEBHOOK_SECRET=""):
+            response = self.post('{"update_id": 1}', token="")
+        self.assertEqual(response.status_code, 404)
+        self.process_update.assert_not_called()
+
+    def test_wrong_or_missing_token(self):
+        for token in ("wrong", "s3cret2", "", None):
+            with self.subTest(token=token):
+                self.assertEqual(self.post('{"update_id": 1}', token=token).status_code, 403)
+        self.process_update.assert_not_called()
+
+    def test_bad_json(self):
+        self.assertEqual(self.post("{not json").status_code, 400)
+        self.process_update.assert_not_called()
+
+    def test_valid_update_is_queued(self):
+        response = self.post('{"update_id": 1, "message": {"text": "hi"}}')
+        self.assertEqual(response.status_code, 200)
+        self.process_update.assert_awaited_once_with(
+            {"update_id": 1, "message": {"text": "hi"}}
+        )
+
+    def test_get_not_allowed(self):
+        self.assertEqual(self.client.get(reverse("telegram-webhook")).status_code, 405)
+
+
+# ---------------------------------------------------------------------
+# Загрузка картинок
+# ---------------------------------------------------------------------
+
+
+class ImageDownloaderTests(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.throttled = asyncio.Event()
+        app = web.Application()
+        app.router.add_get("/throttled", self.throttled_view)
+        app.router.add_get("/ok", self.ok_view)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+        self.downloader = ImageDownloader(concurrency=1, retries=1, backoff=1.0)
+
+    async def asyncTearDown(self):
+        await self.downloader.close()
+        await self.runner.cleanup()
+
+    async def throttled_view(self, request):
+        self.throttled.set()
+        return web.Response(status=429)
+
+    async def ok_view(self, request):
+        return web.Response(body=b"image")
+
+    async def test_backoff_does_not_hold_slot(self):
+        throttled = asyncio.create_task(self.downloader.fetch(self.base_url + "/throttled"))
+        await self.throttled.wait()
+        # Единственное место свободно, пока throttled ждёт повтора (не меньше 1 с)
+        data = await asyncio.wait_for(self.downloader.fetch(self.base_url + "/ok"), 0.5)
+        self.assertEqual(data, b"image")
+        self.assertFalse(throttled.done())
+        self.assertIsNone(await throttled)
+
+
+# ---------------------------------------------------------------------
+# Извлечение карточек в браузере
+# ---------------------------------------------------------------------
+
+
+class FakeElement:
+    def __init__(self, text=None, attrs=None, children=None):
+        self.text = text
+        self.attrs = attrs or {}
+        self.children = children or {}
+
+    async def query_selector(self, selector):
+        return self.children.get(selector)
+
+    async def query_selector_all(self, selector):
+        return self.children.get(selector, [])
+
+    async def inner_text(self):
+        return self.text
+
+    async def get_attribute(self, name):
+        return self.attrs.get(name)
+
+
+class ExtractCardsLegacyTests(IsolatedAsyncioTestCase):
+    async def test_links_resolved_against_page_url(self):
+        link = FakeElement("iPhone 13", {"href": "/moskva/telefony/iphone_13_7"})
+        card = FakeElement(
+            children={
+                "img": FakeElement(attrs={"src": "//img.avito.st/7.jpg"}),
+                "div.iva-item-body-GQomw a": link,
+                "span": FakeElement("54 990 ₽"),
+            }
+        )
+        page = FakeElement(children={"div.iva-item-content-OWwoq": [card]})
+        page.url = "https://www.avito.ru/moskva/telefony?q=iphone"
+
+        [record] = await extract_cards_legacy(page)
+        self.assertEqual(record["url"], "https://www.avito.ru/moskva/telefony/iphone_13_7")
+        self.assertEqual(record["image"], "https://img.avito.st/7.jpg")
+        self.assertEqual(record["title"], "iPhone 13")
+        self.assertIsNone(record["text"])
+        self.assertEqual(set(record), set(CARD_FIELDS))
+
+
+# ---------------------------------------------------------------------
+# Конвейер поиска
+# ---------------------------------------------------------------------
+
+
+class BuildReportTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        overridden = override_settings(RESULT_DB_TTL=0, PREVIEW_SIZE=2)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.resume = asyncio.Event()
+        self.started = asyncio.Event()
+        _, self.listings = sample_listings(3)
+
+        async def stream_avito(query, limit):
+            yield self.listings[0]
+            self.started.set()
+            await self.resume.wait()
+            for listing in self.listings[1:]:
+                yield listing
+
+        async def download_all_images(urls):
+            return [None] * len(urls)
+
+        async def thumbnail_images(images, width, height):
+            return images, ThumbnailStats()
+
+        async def generate_pdf_file(pics, listings):
+            return b"%PDF-"
+
+        for target, value in {
+            "bot.handlers.result_cache": ResultCache(MemoryBackend()),
+            "bot.handlers.save_listings": lambda query, listings: None,
+            "bot.parser.stream_avito": stream_avito,
+            "bot.parser.download_all_images": download_all_images,
+            "bot.thumbnails.thumbnail_images": thumbnail_images,
+            "bot.pdf.generate_pdf_file": generate_pdf_file,
+        }.items():
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def notifier(self, texts):
+        async def notify(stage, text):
+            if stage == "preview":
+                texts.append(text)
+
+        return notify
+
+    async def test_preview_sent_once_while_streaming(self):
+        previews = []
+        report = asyncio.create_task(build_report("https://avito.ru/p", self.notifier(previews)))
+        await self.started.wait()
+        self.resume.set()
+        self.assertEqual(await report, b"%PDF-")
+        self.assertEqual(len(previews), 1)
+        self.assertIn(self.listings[1].title, previews[0])
+
+    async def test_cancelled_requester_gets_no_preview(self):
+        cancelled, waiting = [], []
+        first = asyncio.create_task(build_report("https://avito.ru/p", self.notifier(cancelled)))
+        await self.started.wait()
+        second = asyncio.create_task(build_report("https://avito.ru/p", self.notifier(waiting)))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.resume.set()
+
+        self.assertEqual(await second, b"%PDF-")
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+        self.assertEqual(cancelled, [])
+        self.assertEqual(len(waiting), 1)
+
+
+# ---------------------------------------------------------------------
+# Дисковый кэш картинок
+# ---------------------------------------------------------------------
+
+
+class ImageCacheTests(IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = ImageCache(directory.name, max_bytes=1000)
+
+    def store(self, url, size, age):
+        """
+        Кладёт в кэш файл размером size байт, прочитанный age секунд назад.
+        """
+        path = self.cache._path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+        used = 1_000_000_000 - age
+        os.utime(path, (used, used))
+        return path
+
+    def cached(self, *urls):
+        return [url for url in urls if self.cache._path(url).exists()]
+
+    def test_evicts_least_recently_used_to_90_percent(self):
+        urls = [f"https://img.avito.st/{i}.jpg" for i in range(5)]
+        for age, url in enumerate(reversed(urls)):
+            self.store(url, 300, age)
+
+        self.cache.evict()
+        # 1500 байт: удаляются два самых старых, остаётся 900 <= 90% от 1000
+        self.assertEqual(self.cached(*urls), urls[2:])
+
+    def test_under_limit_keeps_everything(self):
+        urls = [f"https://img.avito.st/{i}.jpg" for i in range(3)]
+        for age, url in enumerate(urls):
+            self.store(url, 300, age)
+        self.cache.evict()
+        self.assertEqual(self.cached(*urls), urls)
+
+    async def test_read_refreshes_position(self):
+        self.store("https://img.avito.st/old.jpg", 400, 30)
+        self.store("https://img.avito.st/mid.jpg", 400, 20)
+        self.store("https://img.avito.st/new.jpg", 400, 10)
+        self.assertEqual(await self.cache.get("https://img.avito.st/old.jpg"), b"x" * 400)
+
+        self.cache.evict()
+        self.assertEqual(
+            self.cached(
+                "https://img.avito.st/old.jpg",
+                "https://img.avito.st/mid.jpg",
+                "https://img.avito.st/new.jpg",
+            ),
+            ["https://img.avito.st/old.jpg", "https://img.avito.st/new.jpg"],
+        )
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    async def test_put_evicts_when_over_limit(self):
+        for i in range(4):
+            await self.cache.put(f"https://img.avito.st/{i}.jpg", b"x" * 300)
+        total = sum(p.stat().st_size for p in self.cache.directory.glob("*/*"))
+        self.assertLessEqual(total, 1000)
+        self.assertTrue(self.cached("https://img.avito.st/3.jpg"))
+
+
+# ---------------------------------------------------------------------
+# Фильтр запросов страницы выдачи
+# ---------------------------------------------------------------------
+
+
+class RequestFilterTests(TestCase):
+    def setUp(self):
+        self.filter = RequestFilter(
+            resource_types=["image", "font"], domains=["mc.yandex.ru", ".DoubleClick.net"]
+        )
+
+    def test_blocked_resource_types(self):
+        self.assertEqual(
+            self.filter.block_reason("https://www.avito.ru/a.jpg", "image"), "type:image"
+        )
+        self.assertEqual(
+            self.filter.block_reason("https://www.avito.ru/a.woff2", "font"), "type:font"
+        )
+        self.assertIsNone(self.filter.block_reason("https://www.avito.ru/moskva", "document"))
+
+    def test_blocked_domains_and_subdomains(self):
+        for url in (
+            "https://mc.yandex.ru/watch/1",
+            "https://MC.Yandex.ru/metrika.js",
+            "https://doubleclick.net/x",
+            "https://stats.g.doubleclick.net/collect?v=2",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.filter.block_reason(url, "script"), "domain")
+
+    def test_similar_domains_allowed(self):
+        for url in (
+            "https://yandex.ru/",
+            "https://notdoubleclick.net/x",
+            "https://doubleclick.net.example.com/x",
+            "https://www.avito.ru/?r=mc.yandex.ru",
+            "data:image/png;base64,AAAA",
+        ):
+            with self.subTest(url=url):
+                self.assertIsNone(self.filter.block_reason(url, "script"))
+
+
+# ---------------------------------------------------------------------
+# Профили браузеров
+# ---------------------------------------------------------------------
+
+
+class ProfileTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = ProfileStore(directory.name, max_age=3600, max_bytes=1000)
+        self.profile = self.store.acquire()
+        self.addCleanup(self.profile.release)
+        self.state = {"cookies": [{"name": "u", "value": "1"}], "origins": []}
+
+    def test_saved_state_is_reused(self):
+        self.assertIsNone(self.profile.state())
+        self.profile._write(self.state)
+        path = self.profile.state()
+        self.assertEqual(path, str(self.profile.state_path))
+        self.assertEqual(json.loads(self.profile.state_path.read_text()), self.state)
+
+    def test_rotated_by_age(self):
+        self.profile._write(self.state)
+        created = self.profile.directory / "created"
+        os.utime(created, (0, 0))
+
+        self.assertIsNone(self.profile.state())
+        self.assertFalse(self.profile.state_path.exists())
+        self.assertFalse(created.exists())
+        # После сброса профиль снова сохраняется с новой датой создания
+        self.profile._write(self.state)
+        self.assertIsNotNone(self.profile.state())
+
+    def test_rotated_by_size(self):
+        self.profile._write(self.state)
+        self.profile.state_path.write_text(" " * 1001)
+        self.assertIsNone(self.profile.state())
+        self.assertFalse(self.profile.state_path.exists())
+
+    def test_oversized_state_not_written(self):
+        self.profile._write({"cookies": [{"value": "x" * 1000}]})
+        self.assertFalse(self.profile.state_path.exists())
+        self.assertIsNone(self.profile.state())
+
+    def test_busy_profile_skipped(self):
+        other = self.store.acquire()
+        self.addCleanup(other.release)
+        self.assertNotEqual(other.directory, self.profile.directory)
+        self.assertIsNone(ProfileStore(self.store.directory, 1, 1, enabled=False).acquire())
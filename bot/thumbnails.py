@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+POINTS_PER_INCH = 72
+
+_executor = None
+# False в процессах, которым нельзя запускать дочерние (см. use_threads)
+_use_processes = True
+
+
+# ---------------------------------------------------------------------
+# Уменьшение одной картинки (выполняется в дочернем процессе)
+# ---------------------------------------------------------------------
+
+
+def make_thumbnail(data, width_px, height_px, quality=80):
+    """
+    Декодирует картинку, вписывает её в прямоугольник с сохранением
+    пропорций и перекодирует в JPEG.
+
+    :param data: Исходные байты картинки.
+    :param width_px: Ширина прямоугольника в пикселях.
+    :param height_px: Высота прямоугольника в пикселях.
+    :param quality: Качество JPEG.
+    :return: Байты JPEG или None, если картинку не удалось декодировать.
+    """
+    try:
+        with Image.open(BytesIO(data)) as img:
+            img.draft("RGB", (width_px, height_px))
+            img = img.convert("RGB")
+            img.thumbnail((width_px, height_px), Image.LANCZOS)
+            out = BytesIO()
+            img.save(out, format="JPEG", quality=quality, optimize=True)
+            return out.getvalue()
+    except Exception as e:
+        logger.warning(f"Не удалось уменьшить картинку: {e}")
+        return None
+
+
+# ---------------------------------------------------------------------
+# Пакетное уменьшение картинок в пуле процессов
+# ---------------------------------------------------------------------
+
+
+class ThumbnailStats:
+    def __init__(self):
+        self.count = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_in - self.bytes_out
+
+    def __str__(self):
+        return (
+            f"{self.count} картинок, {self.bytes_in} -> {self.bytes_out} байт, "
+            f"сэкономлено {self.bytes_saved} байт"
+        )
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        pool = ProcessPoolExecutor if _use_processes else ThreadPoolExecutor
+        _executor = pool(max_workers=settings.THUMBNAIL_WORKERS)
+    return _executor
+
+
+def use_threads():
+    """
+    Уменьшает картинки в пуле потоков вместо процессов. Процессы воркера
+    Celery prefork демонические и не могут запускать дочерние процессы.
+    """
+    global _use_processes
+    _use_processes = False
+    shutdown_executor()
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def thumbnail_images(images, width_pt, height_pt, dpi=None, quality=None):
+    """
+    Уменьшает картинки до размера ячейки PDF, не блокируя event loop.
+
+    :param images: Список байтов картинок (None пропускается).
+    :param width_pt: Ширина ячейки в пунктах.
+    :param height_pt: Высота ячейки в пунктах.
+    :param dpi: Целевое разрешение, по умолчанию settings.THUMBNAIL_DPI.
+    :param quality: Качество JPEG, по умолчанию settings.THUMBNAIL_QUALITY.
+    :return: Список байтов JPEG (или None) и статистика ThumbnailStats.
+    """
+    dpi = dpi or settings.THUMBNAIL_DPI
+    quality = quality or settings.THUMBNAIL_QUALITY
+    width_px = max(1, round(width_pt * dpi / POINTS_PER_INCH))
+    height_px = max(1, round(height_pt * dpi / POINTS_PER_INCH))
+
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+
+    async def resize(data):
+        if not data:
+            return None
+        return await loop.run_in_executor(
+            executor, make_thumbnail, data, width_px, height_px, quality
+        )
+
+    thumbnails = await asyncio.gather(*(resize(data) for data in images))
+
+    stats = ThumbnailStats()
+    for data, thumb in zip(images, thumbnails):
+        if data and thumb:
+            stats.count += 1
+            stats.bytes_in += len(data)
+            stats.bytes_out += len(thumb)
+    return thumbnails, stats
@@ -0,0 +1,48 @@
+import hmac
+import json
+
+from django.conf import settings
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponseNotFound,
+)
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from bot.metrics import registry, render_prometheus, store
+from bot.webhook import process_update
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Метрики задач поиска всех процессов (бот, воркеры Celery)
+    в текстовом формате Prometheus.
+    """
+    body = render_prometheus(store.load_all(registry))
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@csrf_exempt
+@require_POST
+async def telegram_webhook(request):
+    """
+    Принимает обновления от Telegram. Запрос без верного
+    X-Telegram-Bot-Api-Secret-Token отклоняется.
+    """
+    if not settings.WEBHOOK_SECRET:
+        return HttpResponseNotFound()
+
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not hmac.compare_digest(token.encode(), settings.WEBHOOK_SECRET.encode()):
+        return HttpResponseForbidden()
+
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    await process_update(data)
+    return HttpResponse()
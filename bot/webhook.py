@@ -0,0 +1,79 @@
+import asyncio
+import logging
+
+from django.conf import settings
+
+from bot.application import build_application
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Приложение бота внутри процесса ASGI-сервера
+# ---------------------------------------------------------------------
+# Каждый воркер ASGI (uvicorn --workers N, несколько машин за балансировщиком)
+# поднимает своё приложение при первом обновлении. Telegram отправляет
+# каждое обновление один раз, поэтому воркеры делят поток обновлений.
+# Очередь поисков (bot.scheduler) у каждого воркера своя: при
+# SEARCH_BACKEND=local лимиты на пользователя и /cancel не видят
+# задачи других воркеров.
+
+_application = None
+_lock = asyncio.Lock()
+
+
+async def get_application():
+    """
+    Возвращает запущенное приложение бота этого процесса, создавая его
+    при первом вызове. Должна вызываться из event loop ASGI-сервера.
+    """
+    global _application
+    if _application is not None:
+        return _application
+
+    async with _lock:
+        if _application is None:
+            application = build_application(webhook=True)
+            await application.initialize()
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            _application = application
+            logger.info("Приложение бота запущено в режиме webhook")
+            if settings.SEARCH_BACKEND == "local":
+                logger.warning(
+                    "Поиски выполняются в процессе воркера: при нескольких воркерах "
+                    "очередь, лимиты на пользователя и /cancel у каждого свои"
+                )
+    return _application
+
+
+async def process_update(data):
+    """
+    Ставит обновление Telegram в очередь приложения и сразу возвращает
+    управление: обработчики выполняются в фоне, ответ Telegram не ждёт их.
+
+    :param data: JSON обновления из тела запроса.
+    """
+    from telegram import Update
+
+    application = await get_application()
+    update = Update.de_json(data, application.bot)
+    await application.update_queue.put(update)
+
+
+async def shutdown_application():
+    """
+    Останавливает приложение при остановке ASGI-сервера.
+    """
+    global _application
+    async with _lock:
+        if _application is None:
+            return
+        application, _application = _application, None
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        logger.info("Приложение бота остановлено")
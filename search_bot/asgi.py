@@ -13,4 +13,24 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "search_bot.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    """
+    Приложение Django плюс события lifespan: при остановке сервера
+    корректно останавливается бот, запущенный в режиме webhook.
+    """
+    if scope["type"] != "lifespan":
+        return await django_application(scope, receive, send)
+
+    from bot.webhook import shutdown_application
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await shutdown_application()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,15 @@
+"""
+Celery config for search_bot project.
+
+Worker start: celery -A search_bot worker --concurrency 4
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "search_bot.settings")
+
+app = Celery("search_bot")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
@@ -27,8 +27,6 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
-ALLOWED_HOSTS = []
-
 # Указываем путь к env-файлу
 load_dotenv(dotenv_path="environments/env.env")
 
@@ -40,6 +38,8 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 if not API_KEY:
     raise ValueError("Отсутствует API_KEY в файле окружения")
 
+ALLOWED_HOSTS = [host for host in os.getenv("ALLOWED_HOSTS", "").split(",") if host]
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -90,6 +90,14 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # WAL позволяет читать во время записи, а ожидание блокировки
+        # вместо мгновенной ошибки "database is locked" - писать
+        # из нескольких потоков и процессов
+        "OPTIONS": {
+            "timeout": int(os.getenv("SQLITE_TIMEOUT", 20)),
+            "transaction_mode": "IMMEDIATE",
+            "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+        },
     }
 }
 
@@ -134,3 +142,158 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# ---------------------------------------------------------------------
+# Настройки бота
+# ---------------------------------------------------------------------
+
+# Пул браузеров Chromium для парсинга
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 2))
+BROWSER_MAX_JOBS = int(os.getenv("BROWSER_MAX_JOBS", 50))
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "False") == "True"
+
+# Профили браузеров: cookies и localStorage (согласие с баннерами, токены
+# антибота) сохраняются между поисками. Каждый браузер занимает свой каталог
+# <BROWSER_PROFILE_DIR>/<N>; профиль сбрасывается через BROWSER_PROFILE_MAX_AGE
+# секунд или если файл состояния больше BROWSER_PROFILE_MAX_BYTES
+BROWSER_PROFILES_ENABLED = os.getenv("BROWSER_PROFILES_ENABLED", "True") == "True"
+BROWSER_PROFILE_DIR = Path(os.getenv("BROWSER_PROFILE_DIR", BASE_DIR / "cache" / "profiles"))
+BROWSER_PROFILE_MAX_AGE = int(os.getenv("BROWSER_PROFILE_MAX_AGE", 24 * 3600))
+BROWSER_PROFILE_MAX_BYTES = int(os.getenv("BROWSER_PROFILE_MAX_BYTES", 2 * 1024 * 1024))
+
+# Дисковый кэш скриптов и стилей страницы выдачи с доменов ASSET_CACHE_DOMAINS
+ASSET_CACHE_ENABLED = os.getenv("ASSET_CACHE_ENABLED", "True") == "True"
+ASSET_CACHE_DIR = Path(os.getenv("ASSET_CACHE_DIR", BASE_DIR / "cache" / "assets"))
+ASSET_CACHE_MAX_BYTES = int(os.getenv("ASSET_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+ASSET_CACHE_DOMAINS = [d for d in os.getenv("ASSET_CACHE_DOMAINS", "avito.st").split(",") if d]
+
+# Режим извлечения карточек: "bulk" - один page.evaluate на всю страницу,
+# "legacy" - отдельный запрос к браузеру на каждое поле
+PARSER_EXTRACTION = os.getenv("PARSER_EXTRACTION", "bulk")
+
+# Как получать выдачу: "auto" - сначала HTML/встроенный JSON без браузера,
+# браузер - если объявлений меньше HTTP_MIN_RATIO от ожидаемого;
+# "http" - только без браузера; "browser" - только Playwright
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "auto")
+HTTP_MIN_RATIO = float(os.getenv("HTTP_MIN_RATIO", 0.8))
+HTTP_FETCH_TIMEOUT = float(os.getenv("HTTP_FETCH_TIMEOUT", 15))
+
+# Блокировка лишних запросов страницы выдачи: типы ресурсов Playwright
+# и домены рекламы/счётчиков. Картинки не загружаются - парсеру нужен
+# только их адрес из src
+REQUEST_BLOCKING = os.getenv("REQUEST_BLOCKING", "True") == "True"
+BLOCK_RESOURCE_TYPES = [
+    t
+    for t in os.getenv("BLOCK_RESOURCE_TYPES", "image,media,font,texttrack,manifest").split(",")
+    if t
+]
+BLOCK_DOMAINS = [
+    d
+    for d in os.getenv(
+        "BLOCK_DOMAINS",
+        "mc.yandex.ru,an.yandex.ru,adfox.ru,googletagmanager.com,google-analytics.com,"
+        "doubleclick.net,googlesyndication.com,top-fwz1.mail.ru,ad.mail.ru,"
+        "criteo.com,criteo.net,hybrid.ai,mediascope.net",
+    ).split(",")
+    if d
+]
+
+# Прокрутка выдачи: общий дедлайн (с), пауза без мутаций DOM, после которой
+# шаг считается завершённым (мс), максимальное ожидание одного шага (мс) и
+# сколько раз внизу страницы может не появиться новых карточек
+SCROLL_TIMEOUT = float(os.getenv("SCROLL_TIMEOUT", 20))
+SCROLL_QUIET_MS = int(os.getenv("SCROLL_QUIET_MS", 300))
+SCROLL_STEP_MS = int(os.getenv("SCROLL_STEP_MS", 2000))
+SCROLL_MAX_STALLS = int(os.getenv("SCROLL_MAX_STALLS", 2))
+
+# Повторные попытки страницы выдачи: общее время на страницу (с) и пауза
+# перед первой перезагрузкой (с), дальше она удваивается
+RETRY_BUDGET = float(os.getenv("RETRY_BUDGET", 60))
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", 1))
+
+# Загрузка картинок: одновременных загрузок на процесс, соединений к одному
+# хосту, максимальный размер картинки, число повторов и таймаут (с)
+IMAGE_DOWNLOAD_CONCURRENCY = int(os.getenv("IMAGE_DOWNLOAD_CONCURRENCY", 16))
+IMAGE_DOWNLOAD_PER_HOST = int(os.getenv("IMAGE_DOWNLOAD_PER_HOST", 8))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 5 * 1024 * 1024))
+IMAGE_DOWNLOAD_RETRIES = int(os.getenv("IMAGE_DOWNLOAD_RETRIES", 2))
+IMAGE_DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", 10))
+
+# Уменьшение картинок перед вставкой в PDF: процессов в пуле,
+# разрешение ячейки и качество JPEG
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 2))
+THUMBNAIL_DPI = int(os.getenv("THUMBNAIL_DPI", 150))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", 80))
+
+# Дисковый кэш загруженных картинок
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "True") == "True"
+IMAGE_CACHE_DIR = Path(os.getenv("IMAGE_CACHE_DIR", BASE_DIR / "cache" / "images"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# Кэш результатов поиска: "memory" - в памяти процесса, "redis" - общий
+# для всех процессов; время жизни результата в секундах
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 600))
+
+# Где выполнять поиск: "local" - в процессе бота, "celery" - на воркерах
+# (celery -A search_bot worker --concurrency N). В режиме eager задачи
+# выполняются сразу в процессе бота, брокер и хранилище - в памяти.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "local")
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "False") == "True"
+CELERY_BROKER_URL = os.getenv(
+    "CELERY_BROKER_URL", "memory://" if CELERY_TASK_ALWAYS_EAGER else REDIS_URL
+)
+CELERY_RESULT_BACKEND = os.getenv(
+    "CELERY_RESULT_BACKEND", "cache+memory://" if CELERY_TASK_ALWAYS_EAGER else REDIS_URL
+)
+CELERY_TASK_STORE_EAGER_RESULT = True
+CELERY_WORKER_CONCURRENCY = int(os.getenv("CELERY_WORKER_CONCURRENCY", 2))
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_TRACK_STARTED = True
+CELERY_RESULT_EXPIRES = 24 * 60 * 60
+
+# Генерация PDF: процессов в пуле (и одновременных рендеров) и таймаут (с)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", 2))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", 60))
+
+# Сколько первых объявлений отправлять текстом до готовности PDF
+PREVIEW_SIZE = int(os.getenv("PREVIEW_SIZE", 5))
+
+# Сколько объявлений берётся из выдачи по умолчанию и обход нескольких
+# страниц выдачи: карточек на странице Avito, максимум страниц на один
+# поиск и сколько вкладок открывать одновременно
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", 50))
+AVITO_PAGE_SIZE = int(os.getenv("AVITO_PAGE_SIZE", 50))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", 10))
+CRAWL_TABS = int(os.getenv("CRAWL_TABS", 4))
+
+# Результаты поиска сохраняются в БД; повторный поиск в течение этого
+# времени (с) берётся из БД без парсинга. 0 - не использовать БД как кэш
+RESULT_DB_TTL = int(os.getenv("RESULT_DB_TTL", 1800))
+
+# Очередь поисков в процессе бота: одновременных парсингов, сколько
+# запросов может быть у одного пользователя (в очереди и в работе) и
+# начальная оценка длительности поиска (с) для расчёта ожидания
+SCRAPE_MAX_CONCURRENT = int(os.getenv("SCRAPE_MAX_CONCURRENT", 4))
+SCRAPE_USER_QUEUE_DEPTH = int(os.getenv("SCRAPE_USER_QUEUE_DEPTH", 3))
+SCRAPE_AVG_JOB_SECONDS = float(os.getenv("SCRAPE_AVG_JOB_SECONDS", 30))
+
+# Сколько секунд может выполняться один поиск (без ожидания в очереди);
+# SEARCH_SUPERSEDE - новый запрос пользователя отменяет его незавершённые
+SEARCH_JOB_TIMEOUT = float(os.getenv("SEARCH_JOB_TIMEOUT", 300))
+SEARCH_SUPERSEDE = os.getenv("SEARCH_SUPERSEDE", "True") == "True"
+
+# Сколько обновлений Telegram бот обрабатывает одновременно
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", 16))
+
+# Куда процессы бота и воркеры сохраняют метрики для /metrics
+METRICS_DIR = Path(os.getenv("METRICS_DIR", BASE_DIR / "cache" / "metrics"))
+
+# Режим webhook: секрет, который Telegram передаёт в заголовке
+# X-Telegram-Bot-Api-Secret-Token (без него /telegram/webhook/ выключен),
+# и сколько одновременных соединений Telegram открывает к серверу
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
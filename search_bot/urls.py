@@ -18,6 +18,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from bot.views import metrics_view, telegram_webhook
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
+    path("telegram/webhook/", telegram_webhook, name="telegram-webhook"),
 ]